@@ -8,18 +8,34 @@
 # @Description :  提供一系列的有关操作mongodb/pymongo的工具
 
 
-__version__ = "0.1.2.27"
+__version__ = "0.1.6.4"
 
 
 import asyncio
+import os
+import queue
+import threading
 import time
-from typing import Callable
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from functools import partial
+from itertools import islice
+from multiprocessing import Manager
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
 
 import pymongo
+from bson import json_util
 from bson.objectid import ObjectId
 from gitopenlib.utils import basics as gb
+from pymongo import InsertOne, ReplaceOne, UpdateOne
 from pymongo.client_session import ClientSession
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, ConnectionFailure
 
 
 class ManageDB:
@@ -60,7 +76,7 @@ class ManageDB:
         return self._client[db_name][collection_name]
 
 
-def find_by_page(coll, page_size, parse_func):
+def find_by_page(coll, page_size, parse_func, streaming=False, batch_size=None):
     """
     find the data by page and process it through the parse function.
 
@@ -69,25 +85,27 @@ def find_by_page(coll, page_size, parse_func):
         page_size(int): the page size.
         parse_func: A handler function, with a parameter of type list,
             implemented by itself.
+        streaming(bool): read all pages from a single cursor,
+            see `iter_by_page`.
+        batch_size(int): the cursor batch size, only used when streaming.
 
     Returns: None.
     """
 
     current_last_id = ObjectId("000000000000000000000000")
-    current_page = 0
-    page_total = int(coll.find().count() / page_size)
+    page_total = int(coll.estimated_document_count() / page_size)
     print("the total page : {}".format(page_total))
+    pages = (
+        iter_by_page(coll, current_last_id, page_size=page_size, batch_size=batch_size)
+        if streaming
+        else _iter_by_round_trip(coll, current_last_id, None, None, None, page_size)
+    )
     data_size = 0
-    while current_page <= page_total:
+    for current_page, data in enumerate(pages):
         print("processing the page : {}".format(current_page))
-        # 查询
-        condition = {"_id": {"$gt": current_last_id}}
-        data = list(coll.find(condition).limit(page_size))
         # 更新 current_last_id
         current_last_id = data[-1]["_id"]
         print("current_last_id --> {}".format(current_last_id))
-        # 翻页
-        current_page += 1
         # 处理数据
         parse_func(data)
         data_size += len(data)
@@ -96,6 +114,236 @@ def find_by_page(coll, page_size, parse_func):
     print("done.")
 
 
+def _id_range_match(start_id: Any, end_id: Any) -> dict:
+    """`start_id < _id <= end_id`的查询条件，为None的一端不限制。"""
+    id_range = dict()
+    if start_id is not None:
+        id_range["$gt"] = start_id
+    if end_id is not None:
+        id_range["$lte"] = end_id
+    return {"_id": id_range} if id_range else dict()
+
+
+def iter_by_page(
+    coll: Collection,
+    start_id: ObjectId = ObjectId("000000000000000000000000"),
+    pipeline: list = None,
+    session: ClientSession = None,
+    options: dict = None,
+    page_size: int = 100,
+    batch_size: int = None,
+    end_id: ObjectId = None,
+) -> Iterator[list]:
+    """使用单个游标，按`_id`升序流式地读取数据，每次返回一页(list)。
+
+    `aggregate_by_page`每一页都要发送一次`$match` + `$limit`的查询；
+    这里整个过程只打开一个游标，服务器按 batch_size 分批返回数据，
+    省去了每一页重新建立查询的往返开销。
+    每一页最后一条数据的`_id`即为断点，中断后将其传给 start_id 即可继续。
+
+    Args:
+        coll(Collection): 目标Collection，要查询的Collection对象。
+        start_id(ObjectId): 起始ObjectId，不包含该条数据；为None时从第一条数据开始。
+        pipeline(list): 管道命令list，默认为None，使用find查询；
+            注意，管道作用于整个数据流，而不是每一页。
+        session(ClientSession): ClientSession对象。
+        options(dict): aggregate的options选项设置。eg: {"allowDiskUse": True}
+        page_size(int): 每页的数据条目数。
+        batch_size(int): 游标每次从服务器获取的数据条目数，
+            默认为None，由服务器决定(约16MB一批)。
+        end_id(ObjectId): 结束ObjectId，包含该条数据，默认为None，读到最后。
+
+    Returns:
+        Iterator[list]: 每一页的数据。
+    """
+    match = _id_range_match(start_id, end_id)
+    if pipeline is None:
+        cursor = coll.find(match, sort=[("_id", 1)], session=session)
+        if batch_size is not None:
+            cursor = cursor.batch_size(batch_size)
+    else:
+        options = dict(options or {})
+        if batch_size is not None:
+            options["batchSize"] = batch_size
+        condition = [{"$match": match}, {"$sort": {"_id": 1}}]
+        condition.extend(pipeline)
+        cursor = coll.aggregate(pipeline=condition, session=session, **options)
+
+    with cursor:
+        while True:
+            data = list(islice(cursor, page_size))
+            if not data:
+                break
+            yield data
+
+
+def _iter_by_round_trip(
+    coll: Collection,
+    start_id: ObjectId,
+    pipeline: list,
+    session: ClientSession,
+    options: dict,
+    page_size: int,
+) -> Iterator[list]:
+    """
+    每一页发送一次`$match` + `$limit`的查询，直到查询结果为空；
+    pipeline 为None时使用find查询。
+    `estimated_document_count`只是估计值，总页数只用于打印进度，不用于结束翻页。
+    """
+    current_last_id = start_id
+    while True:
+        # 查询
+        if pipeline is None:
+            condition = {"_id": {"$gt": current_last_id}}
+            cursor = coll.find(condition).limit(page_size)
+        else:
+            condition = [
+                #  {"$sort": {"_id": 1}},
+                {"$match": {"_id": {"$gt": current_last_id}}},
+                {"$limit": page_size},
+            ]
+            condition.extend(pipeline)
+            cursor = (
+                coll.aggregate(pipeline=condition, session=session, **options)
+                if options
+                else coll.aggregate(pipeline=condition, session=session)
+            )
+        data = [x for x in cursor]
+        if not data:
+            break
+        # 更新 current_last_id
+        current_last_id = data[-1]["_id"]
+        yield data
+
+
+# 拉取线程结束时放入队列的标记
+_END_OF_PAGES = object()
+
+
+class _FetchError:
+    """拉取线程中发生的异常，放入队列后由主线程抛出。"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _fetch_pages(pages: Iterable[list], page_queue: queue.Queue, stop: threading.Event):
+    """拉取线程：将数据逐页放入有界队列，队列满时阻塞，直到 stop 被设置。"""
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                page_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for page in pages:
+            if not put(page):
+                return
+        put(_END_OF_PAGES)
+    except BaseException as e:
+        put(_FetchError(e))
+    finally:
+        # 提前结束时关闭生成器，释放其中的游标
+        if hasattr(pages, "close"):
+            pages.close()
+
+
+def map_pages(
+    pages: Iterable[list],
+    parse_func: Callable[[list], Any],
+    worker_num: int = 4,
+    prefetch: int = 4,
+    use_process: bool = False,
+    ordered: bool = True,
+) -> Iterator[Any]:
+    """流水线式地处理分页数据，拉取数据和处理数据同时进行。
+
+    一个拉取线程将 pages 中的数据放入容量为 prefetch 的有界队列，
+    队列满时拉取线程阻塞(背压)，内存中最多只有 prefetch + worker_num 页数据；
+    同时由 worker_num 个线程(或进程)执行 parse_func。
+    任何一页出错时，停止拉取、取消尚未执行的任务，并抛出该异常。
+    **注意**：使用多进程时，parse_func需要放在py文件的顶级缩进（顶着行首）。
+
+    Args:
+        pages(Iterable[list]): 分页数据，eg: `iter_by_page(coll)`。
+        parse_func(Callable): 每一个page的数据的处理函数。需要自己实现。
+        worker_num(int): 执行 parse_func 的线程(进程)数目。
+        prefetch(int): 预先拉取的最大页数。
+        use_process(bool): 是否使用多进程，默认为False，使用多线程。
+        ordered(bool): 是否按照页的顺序返回结果，默认为True；
+            为False时按完成的先后返回。
+
+    Returns:
+        Iterator[Any]: 每一页数据经 parse_func 处理后的返回值。
+    """
+    prefetch = max(1, prefetch)
+    page_queue = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    fetcher = threading.Thread(
+        target=_fetch_pages, args=(pages, page_queue, stop), daemon=True
+    )
+    fetcher.start()
+
+    executor = ProcessPoolExecutor if use_process else ThreadPoolExecutor
+    pool = executor(max_workers=worker_num)
+    pending = []
+    exhausted = False
+
+    def has_idle_worker():
+        # 按顺序返回时，已完成但还没有返回的任务不占用 worker，
+        # 但其总数不超过 worker_num + prefetch，使拉取线程能感受到背压
+        if len(pending) >= worker_num + prefetch:
+            return False
+        return sum(not f.done() for f in pending) < worker_num
+
+    try:
+        while True:
+            # 空闲的 worker 从队列中取数据，没有正在执行的任务时阻塞等待
+            while not exhausted and has_idle_worker():
+                try:
+                    item = page_queue.get(block=not pending, timeout=0.1)
+                except queue.Empty:
+                    if pending:
+                        break
+                    continue
+                if item is _END_OF_PAGES:
+                    exhausted = True
+                elif isinstance(item, _FetchError):
+                    raise item.error
+                else:
+                    pending.append(pool.submit(parse_func, item))
+            if not pending:
+                break
+
+            # 还有空闲的 worker 时，定时返回去检查是否有新拉取的数据
+            idle = not exhausted and has_idle_worker()
+            running = [f for f in pending if not f.done()] or pending
+            wait(running, timeout=0.05 if idle else None, return_when=FIRST_COMPLETED)
+            if ordered:
+                while pending and pending[0].done():
+                    yield pending.pop(0).result()
+            else:
+                for future in [f for f in pending if f.done()]:
+                    pending.remove(future)
+                    yield future.result()
+    finally:
+        stop.set()
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+        fetcher.join()
+
+
+def _parse_page(parse_func: Callable[[list], None], data: list):
+    """处理一页数据，返回该页的数据条目数和最后一条数据的`_id`。"""
+    parse_func(data)
+    return len(data), data[-1]["_id"]
+
+
 def aggregate_by_page_asyncio(
     coll,
     start_id: ObjectId = ObjectId("000000000000000000000000"),
@@ -108,6 +356,11 @@ def aggregate_by_page_asyncio(
     log_file: str = "./aggregate_by_page.log",
     open_async: bool = False,
     slave_num: int = 4,
+    streaming: bool = False,
+    batch_size: int = None,
+    prefetch: int = 0,
+    use_process: bool = False,
+    ordered: bool = True,
 ):
     """mongodb的聚合查询，具备分页查询、异步io处理数据功能。
 
@@ -124,6 +377,14 @@ def aggregate_by_page_asyncio(
         log_file(str): 日志文件完整路径，open_log为True时需要填写，False可不填写。
         open_async(bool): 是否开启异步io处理数据，默认不开启。
         slave_num(int): 执行任务的协程数目，默认为4。
+        streaming(bool): 是否使用单个游标流式地读取所有页，默认为False，每页查询一次；
+            参见`iter_by_page`，此时 pipeline 作用于整个数据流。
+        batch_size(int): streaming为True时，游标每次从服务器获取的数据条目数。
+        prefetch(int): 预先拉取的最大页数，默认为0，拉取和处理交替进行；
+            大于0时拉取和处理同时进行，由 slave_num 个 worker 处理数据，参见`map_pages`。
+        use_process(bool): prefetch大于0时，是否使用多进程处理数据。
+        ordered(bool): prefetch大于0时，是否按照页的顺序处理完成；
+            为False时，日志中的 current_last_id 不再能作为断点。
 
     Returns:
         None
@@ -144,64 +405,80 @@ def aggregate_by_page_asyncio(
     current_last_id = start_id
     current_page = 0
 
-    count = coll.find().count()
-
+    count = coll.estimated_document_count()
     page_total = (
         int(count / page_size) if count % page_size == 0 else int(count / page_size) + 1
     )
     log_msg = "# the total page : {}".format(page_total)
     print(log_msg)
 
+    pages = (
+        iter_by_page(coll, start_id, pipeline, session, options, page_size, batch_size)
+        if streaming
+        else _iter_by_round_trip(coll, start_id, pipeline, session, options, page_size)
+    )
+
     data_size = 0
     total_time = time.time()
-    while current_page < page_total:
-        start_time = time.time()
-        log_msg = "# processing the page : {}".format(current_page)
-        wprint(log_msg)
-        # 查询
-        condition = [
-            #  {"$sort": {"_id": 1}},
-            {"$match": {"_id": {"$gt": current_last_id}}},
-            {"$limit": page_size},
-        ]
-        condition.extend(pipeline)
-        cursor = (
-            coll.aggregate(pipeline=condition, session=session, **options)
-            if options
-            else coll.aggregate(pipeline=condition, session=session)
+    if prefetch > 0:
+        # 拉取数据和处理数据同时进行
+        results = map_pages(
+            pages,
+            partial(_parse_page, parse_func),
+            slave_num,
+            prefetch,
+            use_process,
+            ordered,
         )
+        for size, current_last_id in results:
+            log_msg = "# processed the page : {}".format(current_page)
+            wprint(log_msg)
+            # 更新 current_last_id，作为断点
+            log_msg = "# current_last_id --> {}".format(current_last_id)
+            wprint(log_msg)
+            current_page += 1
+            data_size += size
+            log_msg = "*" * 36
+            wprint(log_msg)
+    else:
+        while True:
+            start_time = time.time()
+            # 查询
+            data = next(pages, None)
+            if data is None:
+                break
+            log_msg = "# processing the page : {}".format(current_page)
+            wprint(log_msg)
 
-        data = [x for x in cursor]
-
-        log_msg = "# find this page data cost time: {}s".format(
-            time.time() - start_time
-        )
-        wprint(log_msg)
+            log_msg = "# find this page data cost time: {}s".format(
+                time.time() - start_time
+            )
+            wprint(log_msg)
 
-        # 更新 current_last_id
-        current_last_id = data[-1]["_id"]
-        log_msg = "# current_last_id --> {}".format(current_last_id)
-        wprint(log_msg)
+            # 更新 current_last_id，作为断点
+            current_last_id = data[-1]["_id"]
+            log_msg = "# current_last_id --> {}".format(current_last_id)
+            wprint(log_msg)
 
-        # 翻页
-        current_page += 1
-        # 处理数据
-        if open_async:
-            loop = asyncio.get_event_loop()
-            chunks = gb.chunks(data, slave_num)
-            loop.run_until_complete(
-                asyncio.gather(*[parse_(loop, chunk) for chunk in chunks])
-            )
-            chunks.clear()
-        else:
-            parse_func(data)
+            # 翻页
+            current_page += 1
+            # 处理数据
+            if open_async:
+                loop = asyncio.get_event_loop()
+                chunks = gb.chunks(data, slave_num)
+                loop.run_until_complete(
+                    asyncio.gather(*[parse_(loop, chunk) for chunk in chunks])
+                )
+                chunks.clear()
+            else:
+                parse_func(data)
 
-        data_size += len(data)
-        data.clear()
-        log_msg = "# elapsed time: {}s".format(time.time() - start_time)
-        wprint(log_msg)
-        log_msg = "*" * 36
-        wprint(log_msg)
+            data_size += len(data)
+            data.clear()
+            log_msg = "# elapsed time: {}s".format(time.time() - start_time)
+            wprint(log_msg)
+            log_msg = "*" * 36
+            wprint(log_msg)
 
     log_msg = "# the size of all processed data : --> {}\n".format(data_size)
     log_msg += "# total time cost is : --> {}\n".format(time.time() - total_time)
@@ -221,6 +498,8 @@ def aggregate_by_page(
     parse_func: Callable[[list], None] = None,
     open_log: bool = False,
     log_file: str = "./aggregate_by_page.log",
+    streaming: bool = False,
+    batch_size: int = None,
 ):
     """mongodb的聚合查询，具备分页查询功能。
 
@@ -235,6 +514,9 @@ def aggregate_by_page(
         open_log(bool): 是否开启日志，记录当前的Current ObjectId，
             方便打断任务后，再次运行时扔给start_id。
         log_file(str): 日志文件完整路径，open_log为True时需要填写，False可不填写。
+        streaming(bool): 是否使用单个游标流式地读取所有页，默认为False，每页查询一次；
+            参见`iter_by_page`，此时 pipeline 作用于整个数据流。
+        batch_size(int): streaming为True时，游标每次从服务器获取的数据条目数。
 
     Returns:
         None
@@ -246,39 +528,34 @@ def aggregate_by_page(
             log_file.write(log_msg + "\n")
 
     if open_log:
-        log_file = open("aggregate_by_page.log", "a+")
+        log_file = open(log_file, "a+")
 
     current_last_id = start_id
     current_page = 0
-    #  count = coll.find({"_id": {"$gt": current_last_id}}).count()
-    count = coll.find().count()
+    count = coll.estimated_document_count()
     page_total = (
         int(count / page_size) if count % page_size == 0 else int(count / page_size) + 1
     )
     log_msg = "# the total page : {}".format(page_total)
     print(log_msg)
 
+    pages = (
+        iter_by_page(coll, start_id, pipeline, session, options, page_size, batch_size)
+        if streaming
+        else _iter_by_round_trip(coll, start_id, pipeline, session, options, page_size)
+    )
+
     data_size = 0
     total_time = time.time()
-
-    while current_page < page_total:
+    while True:
         start_time = time.time()
+        # 查询
+        data = next(pages, None)
+        if data is None:
+            break
         log_msg = "# processing the page : {}".format(current_page)
         wprint(log_msg)
-        # 查询
-        condition = [
-            #  {"$sort": {"_id": 1}},
-            {"$match": {"_id": {"$gt": current_last_id}}},
-            {"$limit": page_size},
-        ]
-        condition.extend(pipeline)
-        cursor = (
-            coll.aggregate(pipeline=condition, session=session, **options)
-            if options
-            else coll.aggregate(pipeline=condition, session=session)
-        )
-        data = [x for x in cursor]
-        # 更新 current_last_id
+        # 更新 current_last_id，作为断点
         current_last_id = data[-1]["_id"]
         log_msg = "# current_last_id --> {}".format(current_last_id)
         wprint(log_msg)
@@ -299,3 +576,571 @@ def aggregate_by_page(
     wprint(log_msg)
     if open_log:
         log_file.close()
+
+
+def _quantile_bounds(keys: list, partition_num: int) -> list:
+    """取有序的 keys 中的等分点作为区间边界。"""
+    if not keys:
+        return []
+    return [keys[len(keys) * i // partition_num] for i in range(1, partition_num)]
+
+
+def _timestamp_bounds(first_id: ObjectId, last_id: ObjectId, partition_num: int):
+    """按两个 ObjectId 的生成时间等分，得到区间边界。"""
+    if not isinstance(first_id, ObjectId) or not isinstance(last_id, ObjectId):
+        raise ValueError(
+            "The 'timestamp' method requires ObjectId _id, "
+            + f"got {type(first_id).__name__}, use 'sample' instead."
+        )
+    t0 = first_id.generation_time
+    t1 = last_id.generation_time
+    return [
+        ObjectId.from_datetime(t0 + (t1 - t0) * i / partition_num)
+        for i in range(1, partition_num)
+    ]
+
+
+def _ranges_from_bounds(bounds: list) -> List[Tuple[Any, Any]]:
+    """由区间边界得到区间列表，重复的边界会被合并。"""
+    bounds = sorted(set(bounds))
+    # 第一个区间不设下界：`_id`不是 ObjectId 时，`$gt ObjectId(0)`匹配不到任何数据
+    starts = [None] + bounds
+    ends = bounds + [None]
+    return list(zip(starts, ends))
+
+
+def split_id_ranges(
+    coll: Collection,
+    partition_num: int,
+    method: str = "sample",
+    sample_size: int = None,
+) -> List[Tuple[Any, Any]]:
+    """将`_id`的取值范围划分为若干个区间，用于并行扫描。
+
+    每个区间为 (start, end)，包含`start < _id <= end`的数据；
+    第一个区间的 start 和最后一个区间的 end 为None，即不限制。
+    边界可能重复时会合并，所以返回的区间数目可能少于 partition_num。
+
+    Args:
+        coll(Collection): 目标Collection。
+        partition_num(int): 区间数目。
+        method(str): 划分方法，
+            "sample"：使用`$sample`随机抽样，取抽样`_id`的分位数作为边界，各区间的数据量大致相同；
+            "timestamp"：按最小、最大 ObjectId 的生成时间等分，要求`_id`为 ObjectId；
+            "split_vector"：使用`splitVector`命令，需要相应的权限。
+        sample_size(int): method为"sample"时的抽样数目，默认为 partition_num * 100。
+
+    Returns:
+        List[Tuple[Any, Any]]: 区间列表。
+    """
+    bounds = []
+    if partition_num > 1 and method == "sample":
+        sample_size = sample_size or partition_num * 100
+        ids = sorted(
+            doc["_id"]
+            for doc in coll.aggregate(
+                [{"$sample": {"size": sample_size}}, {"$project": {"_id": 1}}]
+            )
+        )
+        bounds = _quantile_bounds(ids, partition_num)
+    elif partition_num > 1 and method == "timestamp":
+        first = coll.find_one(sort=[("_id", 1)], projection={"_id": 1})
+        last = coll.find_one(sort=[("_id", -1)], projection={"_id": 1})
+        if first is not None:
+            bounds = _timestamp_bounds(first["_id"], last["_id"], partition_num)
+    elif partition_num > 1 and method == "split_vector":
+        db = coll.database
+        size = db.command("collStats", coll.name)["size"]
+        result = db.command(
+            "splitVector",
+            coll.full_name,
+            keyPattern={"_id": 1},
+            maxChunkSize=max(1, int(size / partition_num / 1024 / 1024)),
+        )
+        keys = [key["_id"] for key in result["splitKeys"]]
+        bounds = _quantile_bounds(keys, partition_num)
+    elif method not in ("sample", "timestamp", "split_vector"):
+        raise ValueError(
+            f"Unknown method: {method}, "
+            + "expected 'sample', 'timestamp' or 'split_vector'."
+        )
+
+    return _ranges_from_bounds(bounds)
+
+
+def _save_checkpoint(file_path: str, state):
+    """写入断点文件，先写临时文件再替换，避免中断时文件不完整。"""
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json_util.dumps(state))
+    os.replace(tmp_path, file_path)
+
+
+def _load_checkpoint(file_path: str):
+    """读取断点文件，文件不存在时返回None。"""
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json_util.loads(f.read())
+
+
+def _scan_partition(
+    index: int,
+    db_name: str,
+    collection_name: str,
+    db_kwargs: dict,
+    start_id: Any,
+    end_id: Any,
+    parse_func: Callable[[list], None],
+    pipeline: list,
+    options: dict,
+    page_size: int,
+    batch_size: int,
+    checkpoint_dir: str,
+    stop=None,
+):
+    """
+    扫描一个`_id`区间，使用自己的 MongoClient；每处理完一页就更新该区间的断点。
+    stop(Event) 被设置时(其他区间出错)，处理完当前页后停止，该区间保持未完成的状态。
+    """
+    checkpoint = None
+    if checkpoint_dir is not None:
+        checkpoint = os.path.join(checkpoint_dir, f"partition_{index}.json")
+        state = _load_checkpoint(checkpoint)
+        if state is not None:
+            if state["done"]:
+                return index, 0
+            start_id = state["last"]
+
+    db = ManageDB(**(db_kwargs or {}))
+    coll = db.coll(db_name, collection_name)
+    data_size = 0
+    try:
+        for data in iter_by_page(
+            coll, start_id, pipeline, None, options, page_size, batch_size, end_id
+        ):
+            parse_func(data)
+            data_size += len(data)
+            start_id = data[-1]["_id"]
+            if checkpoint is not None:
+                _save_checkpoint(checkpoint, {"last": start_id, "done": False})
+            if stop is not None and stop.is_set():
+                return index, data_size
+        if checkpoint is not None:
+            _save_checkpoint(checkpoint, {"last": start_id, "done": True})
+    finally:
+        db.client().close()
+    return index, data_size
+
+
+def scan_by_partition(
+    db_name: str,
+    collection_name: str,
+    parse_func: Callable[[list], None],
+    partition_num: int = 4,
+    db_kwargs: dict = None,
+    pipeline: list = None,
+    options: dict = None,
+    page_size: int = 100,
+    batch_size: int = None,
+    split_method: str = "sample",
+    use_process: bool = False,
+    checkpoint_dir: str = None,
+):
+    """将`_id`划分为若干个区间，并行地扫描整个Collection。
+
+    每个区间由一个线程(或进程)使用自己的 MongoClient 扫描，参见`iter_by_page`，
+    每一页数据交给 parse_func 处理。
+    **注意**：使用多进程时，parse_func需要放在py文件的顶级缩进（顶着行首）。
+
+    设置 checkpoint_dir 后，区间划分保存在`partitions.json`中，
+    每个区间的断点(最后处理的`_id`)保存在`partition_{i}.json`中；
+    任务中断后使用相同的 checkpoint_dir 再次运行，只会从断点继续扫描未完成的区间。
+
+    Args:
+        db_name(str): 数据库名称。
+        collection_name(str): Collection名称。
+        parse_func(Callable): 每一个page的数据的处理函数。需要自己实现。
+        partition_num(int): 区间数目，也是并行的线程(进程)数目。
+        db_kwargs(dict): 创建`ManageDB`的参数，eg: {"host": "127.0.0.1", "port": 27017}
+        pipeline(list): 管道命令list，默认为None，使用find查询。
+        options(dict): aggregate的options选项设置。eg: {"allowDiskUse": True}
+        page_size(int): 每页的数据条目数。
+        batch_size(int): 游标每次从服务器获取的数据条目数。
+        split_method(str): 区间划分方法，参见`split_id_ranges`。
+        use_process(bool): 是否使用多进程，默认为False，使用多线程。
+        checkpoint_dir(str): 断点文件的目录，默认为None，不保存断点。
+
+    Returns:
+        int: 处理的数据条目数。
+    """
+    ranges = None
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        partitions_file = os.path.join(checkpoint_dir, "partitions.json")
+        ranges = _load_checkpoint(partitions_file)
+    if ranges is None:
+        db = ManageDB(**(db_kwargs or {}))
+        try:
+            ranges = split_id_ranges(
+                db.coll(db_name, collection_name), partition_num, split_method
+            )
+        finally:
+            db.client().close()
+        if checkpoint_dir is not None:
+            _save_checkpoint(partitions_file, ranges)
+    print("# the number of partitions : {}".format(len(ranges)))
+
+    # 任何一个区间出错时，通知其他正在扫描的区间停止；进程间需要使用 Manager 的 Event
+    manager = Manager() if use_process else None
+    stop = manager.Event() if use_process else threading.Event()
+    executor = ProcessPoolExecutor if use_process else ThreadPoolExecutor
+    data_size = 0
+    total_time = time.time()
+    try:
+        data_size = _run_partitions(
+            executor,
+            ranges,
+            stop,
+            db_name,
+            collection_name,
+            db_kwargs,
+            parse_func,
+            pipeline,
+            options,
+            page_size,
+            batch_size,
+            checkpoint_dir,
+        )
+    finally:
+        if manager is not None:
+            manager.shutdown()
+
+    print("# the size of all processed data : --> {}".format(data_size))
+    print("# total time cost is : --> {}".format(time.time() - total_time))
+    return data_size
+
+
+def _run_partitions(
+    executor,
+    ranges: list,
+    stop,
+    db_name: str,
+    collection_name: str,
+    db_kwargs: dict,
+    parse_func: Callable[[list], None],
+    pipeline: list,
+    options: dict,
+    page_size: int,
+    batch_size: int,
+    checkpoint_dir: str,
+) -> int:
+    """在线程池(或进程池)中扫描各个区间，返回处理的数据条目数。"""
+    data_size = 0
+    with executor(max_workers=len(ranges)) as pool:
+        futures = [
+            pool.submit(
+                _scan_partition,
+                index,
+                db_name,
+                collection_name,
+                db_kwargs,
+                start_id,
+                end_id,
+                parse_func,
+                pipeline,
+                options,
+                page_size,
+                batch_size,
+                checkpoint_dir,
+                stop,
+            )
+            for index, (start_id, end_id) in enumerate(ranges)
+        ]
+        try:
+            for future in as_completed(futures):
+                index, size = future.result()
+                data_size += size
+                print("# partition {} done, size : {}".format(index, size))
+        except BaseException:
+            # 正在运行的区间无法 cancel，设置 stop 使其处理完当前页后退出
+            stop.set()
+            for future in futures:
+                future.cancel()
+            raise
+    return data_size
+
+
+# 可以重试的写入错误码，如网络错误、主节点切换等
+_TRANSIENT_ERROR_CODES = {
+    6,  # HostUnreachable
+    7,  # HostNotFound
+    89,  # NetworkTimeout
+    91,  # ShutdownInProgress
+    189,  # PrimarySteppedDown
+    262,  # ExceededTimeLimit
+    9001,  # SocketException
+    10107,  # NotWritablePrimary
+    11600,  # InterruptedAtShutdown
+    11602,  # InterruptedDueToReplStateChange
+    13435,  # NotPrimaryNoSecondaryOk
+    13436,  # NotPrimaryOrSecondary
+}
+
+
+class BulkWriter:
+    """批量写入MongoDB。
+
+    缓存 InsertOne、UpdateOne、ReplaceOne 等写操作，
+    数量达到 batch_size 或距离上次写入超过 flush_interval 秒时，
+    使用`bulk_write(ordered=False)`一次写入；网络错误、主节点切换等暂时性的错误会重试。
+    设置了 flush_interval 时，后台线程会定时写入，即使没有新的操作也不会一直缓存。
+    可以在多个线程中共用一个 BulkWriter，用完后需要调用 close (或使用 with 语句)。
+
+    example:
+        ```python
+        with BulkWriter(coll, batch_size=1000) as writer:
+            for doc in docs:
+                writer.update_one({"_id": doc["_id"]}, {"$set": doc}, upsert=True)
+        print(writer.report())
+        ```
+    """
+
+    def __init__(
+        self,
+        coll: Collection,
+        batch_size: int = 1000,
+        flush_interval: float = None,
+        max_retries: int = 3,
+        retry_interval: float = 1.0,
+        raise_errors: bool = True,
+        verbose: bool = False,
+    ):
+        """
+        Args:
+            coll(Collection): 目标Collection。
+            batch_size(int): 每次写入的操作数目。
+            flush_interval(float): 距离上次写入超过该秒数时写入，默认为None，不限制。
+            max_retries(int): 暂时性错误的最大重试次数，每次重试的等待时间加倍。
+            retry_interval(float): 第一次重试前的等待秒数。
+            raise_errors(bool): 有不可重试的写入错误(如重复的`_id`)或 write concern 错误时，
+                是否抛出 BulkWriteError；为False时，错误保存在 write_errors
+                和 write_concern_errors 中。
+                后台线程写入时的异常在下一次 add、flush 或 close 时抛出。
+            verbose(bool): 每次写入后是否打印写入的数目和速度。
+        """
+        self.coll = coll
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.raise_errors = raise_errors
+        self.verbose = verbose
+
+        self._ops = list()
+        self._lock = threading.RLock()
+        self._start_time = time.time()
+        self._last_flush = self._start_time
+
+        self.op_count = 0
+        self.flush_count = 0
+        self.write_time = 0.0
+        self.write_errors = list()
+        self.write_concern_errors = list()
+        self.counts = {
+            "nInserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nUpserted": 0,
+            "nRemoved": 0,
+        }
+
+        # 后台定时写入的线程，以及它写入时遇到的异常
+        self._error = None
+        self._closed = threading.Event()
+        self._flusher = None
+        if flush_interval is not None:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+
+    def add(self, operation):
+        """
+        添加一个写操作，eg: `InsertOne(doc)`，满足条件时立即写入。
+        后台线程写入出错时抛出该异常，此时 operation 已经加入缓存，
+        之后的 flush 或 close 会写入它。
+        """
+        with self._lock:
+            self._ops.append(operation)
+            self.op_count += 1
+        self._raise_error()
+        with self._lock:
+            if len(self._ops) < self.batch_size and (
+                self.flush_interval is None
+                or time.time() - self._last_flush < self.flush_interval
+            ):
+                return
+            ops = self._take_ops()
+        self._write(ops)
+
+    def insert_one(self, document: dict):
+        """添加一个 InsertOne 操作。"""
+        self.add(InsertOne(document))
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False):
+        """添加一个 UpdateOne 操作。"""
+        self.add(UpdateOne(filter, update, upsert=upsert))
+
+    def replace_one(self, filter: dict, replacement: dict, upsert: bool = False):
+        """添加一个 ReplaceOne 操作。"""
+        self.add(ReplaceOne(filter, replacement, upsert=upsert))
+
+    def flush(self):
+        """立即写入缓存的所有操作，之后再抛出后台线程写入时的异常。"""
+        with self._lock:
+            ops = self._take_ops()
+        if ops:
+            self._write(ops)
+        self._raise_error()
+
+    def close(self):
+        """停止后台线程，写入缓存的所有操作，verbose为True时打印统计信息。"""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        try:
+            self.flush()
+        finally:
+            if self.verbose:
+                print("# bulk write report : {}".format(self.report()))
+
+    def report(self) -> dict:
+        """写入的统计信息，包括各类操作的数目、错误数目和每秒写入的操作数。"""
+        with self._lock:
+            elapsed = time.time() - self._start_time
+            result = dict(self.counts)
+            result["ops"] = self.op_count
+            result["errors"] = len(self.write_errors)
+            result["write_concern_errors"] = len(self.write_concern_errors)
+            result["flushes"] = self.flush_count
+            result["write_time"] = self.write_time
+            result["ops_per_second"] = self.op_count / elapsed if elapsed > 0 else 0.0
+            return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # with 语句中已经抛出异常时，close 的异常只打印，不覆盖原来的异常
+        try:
+            self.close()
+        except Exception as e:
+            print("# bulk write error on close : {!r}".format(e))
+
+    def _flush_loop(self):
+        """后台线程：距离上次写入超过 flush_interval 秒时写入缓存的操作。"""
+        while True:
+            with self._lock:
+                wait = self._last_flush + self.flush_interval - time.time()
+            if self._closed.wait(max(wait, 0.0)):
+                return
+            with self._lock:
+                if time.time() - self._last_flush < self.flush_interval:
+                    continue
+                ops = self._take_ops()
+            if not ops:
+                continue
+            try:
+                self._write(ops)
+            except Exception as e:
+                with self._lock:
+                    if self._error is None:
+                        self._error = e
+
+    def _raise_error(self):
+        """抛出后台线程写入时遇到的异常。"""
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _take_ops(self) -> list:
+        """取出缓存的操作，调用时需要持有锁。"""
+        ops, self._ops = self._ops, list()
+        self._last_flush = time.time()
+        return ops
+
+    def _add_counts(self, counts: dict, result: dict):
+        """累加`bulk_write`结果中各类操作的数目。"""
+        for key in counts:
+            counts[key] += result.get(key, 0)
+
+    def _write(self, ops: list):
+        """
+        使用`bulk_write(ordered=False)`写入，只重试暂时性错误的操作。
+        网络错误后会整批重试，之前可能已经写入的 InsertOne 返回重复键错误(11000)，
+        视为写入成功。
+        """
+        start_time = time.time()
+        counts = dict.fromkeys(self.counts, 0)
+        errors = list()
+        concern_errors = list()
+        resent = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt > 0:
+                    time.sleep(self.retry_interval * 2 ** (attempt - 1))
+                try:
+                    result = self.coll.bulk_write(ops, ordered=False)
+                except ConnectionFailure:
+                    # 整批写入的结果未知，重试整批操作
+                    if attempt == self.max_retries:
+                        raise
+                    resent = True
+                    continue
+                except BulkWriteError as e:
+                    self._add_counts(counts, e.details)
+                    concern_errors.extend(e.details.get("writeConcernErrors", []))
+                    retry = list()
+                    for error in e.details.get("writeErrors", []):
+                        op = ops[error["index"]]
+                        if (
+                            resent
+                            and error.get("code") == 11000
+                            and isinstance(op, InsertOne)
+                        ):
+                            counts["nInserted"] += 1
+                        elif (
+                            error.get("code") in _TRANSIENT_ERROR_CODES
+                            and attempt < self.max_retries
+                        ):
+                            retry.append(op)
+                        else:
+                            errors.append(error)
+                    ops = retry
+                    if not ops:
+                        break
+                    continue
+                self._add_counts(counts, result.bulk_api_result)
+                break
+        finally:
+            with self._lock:
+                self.flush_count += 1
+                self.write_time += time.time() - start_time
+                self.write_errors.extend(errors)
+                self.write_concern_errors.extend(concern_errors)
+                self._add_counts(self.counts, counts)
+            if self.verbose:
+                report = self.report()
+                print(
+                    "# bulk write : {} ops, {:.1f} ops/s".format(
+                        report["ops"], report["ops_per_second"]
+                    )
+                )
+
+        if (errors or concern_errors) and self.raise_errors:
+            counts["writeErrors"] = errors
+            counts["writeConcernErrors"] = concern_errors
+            raise BulkWriteError(counts)
@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2026
+# @Author :  GitOPEN
+# @Email  :  gitopen@gmail.com
+# @Date   :  2026-10-17 10:12:36
+# @Description :  mongo.py 的 asyncio 版本，使用异步驱动，接口与 motor 相同
+
+
+__version__ = "0.1.2"
+
+
+import asyncio
+import inspect
+import os
+import time
+from typing import Any, AsyncIterator, Callable
+
+from bson.objectid import ObjectId
+
+from gitopenlib.helpers import mongo as gm
+
+try:
+    # pymongo>=4.10 自带 asyncio 客户端
+    from pymongo import AsyncMongoClient
+except ImportError:
+    from motor.motor_asyncio import AsyncIOMotorClient as AsyncMongoClient
+
+
+async def _maybe_await(result):
+    """motor 和 pymongo 的异步客户端中，有些方法一个返回协程，一个直接返回结果。"""
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+async def _run_in_thread(func: Callable, *args):
+    """在默认线程池中执行阻塞的函数(如读写文件)，不阻塞事件循环。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+async def _call_parse_func(parse_func: Callable[[list], Any], data: list):
+    """parse_func 可以是协程函数；普通函数在线程池中执行，不阻塞事件循环。"""
+    if asyncio.iscoroutinefunction(parse_func):
+        return await parse_func(data)
+    return await _run_in_thread(parse_func, data)
+
+
+class AsyncManageDB:
+    """
+    A simple manager class for the asyncio mongodb client,
+    the collections are compatible with motor.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=27017,
+        username=None,
+        password=None,
+        maxIdleTimeMS=30000,
+        socketTimeoutMS=30000,
+        connectTimeoutMS=30000,
+    ):
+        self._client = AsyncMongoClient(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            maxIdleTimeMS=maxIdleTimeMS,
+            socketTimeoutMS=socketTimeoutMS,
+            connectTimeoutMS=connectTimeoutMS,
+        )
+
+    def client(self):
+        """
+        get the mongodb client.
+        """
+        return self._client
+
+    def coll(self, db_name, collection_name):
+        """
+        get the collection from specific db.
+        """
+        return self._client[db_name][collection_name]
+
+    async def close(self):
+        """
+        close the mongodb client.
+        """
+        await _maybe_await(self._client.close())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+async def iter_by_page(
+    coll,
+    start_id: ObjectId = ObjectId("000000000000000000000000"),
+    pipeline: list = None,
+    session=None,
+    options: dict = None,
+    page_size: int = 100,
+    batch_size: int = None,
+    end_id: ObjectId = None,
+) -> AsyncIterator[list]:
+    """使用单个游标，按`_id`升序流式地读取数据，每次返回一页(list)。
+
+    参数与`mongo.iter_by_page`相同，使用方法：
+        ```python
+        async for data in iter_by_page(coll):
+            ...
+        ```
+
+    Returns:
+        AsyncIterator[list]: 每一页的数据。
+    """
+    match = gm._id_range_match(start_id, end_id)
+    if pipeline is None:
+        cursor = coll.find(match, sort=[("_id", 1)], session=session)
+        if batch_size is not None:
+            cursor = cursor.batch_size(batch_size)
+    else:
+        options = dict(options or {})
+        if batch_size is not None:
+            options["batchSize"] = batch_size
+        condition = [{"$match": match}, {"$sort": {"_id": 1}}]
+        condition.extend(pipeline)
+        cursor = await _maybe_await(
+            coll.aggregate(pipeline=condition, session=session, **options)
+        )
+
+    try:
+        while True:
+            data = await cursor.to_list(page_size)
+            if not data:
+                break
+            yield data
+    finally:
+        await _maybe_await(cursor.close())
+
+
+async def find_by_page(coll, page_size, parse_func, batch_size=None):
+    """
+    find the data by page and process it through the parse function.
+
+    Args:
+        coll: the asyncio collection object.
+        page_size(int): the page size.
+        parse_func: A handler function, with a parameter of type list,
+            implemented by itself, it can be a coroutine function.
+        batch_size(int): the cursor batch size.
+
+    Returns: None.
+    """
+    page_total = int(await coll.estimated_document_count() / page_size)
+    print("the total page : {}".format(page_total))
+    data_size = 0
+    current_page = 0
+    async for data in iter_by_page(coll, page_size=page_size, batch_size=batch_size):
+        print("processing the page : {}".format(current_page))
+        # 更新 current_last_id
+        current_last_id = data[-1]["_id"]
+        print("current_last_id --> {}".format(current_last_id))
+        current_page += 1
+        # 处理数据
+        await _call_parse_func(parse_func, data)
+        data_size += len(data)
+
+    print("the size of all processed data : --> {}".format(data_size))
+    print("done.")
+
+
+async def aggregate_by_page(
+    coll,
+    start_id: ObjectId = ObjectId("000000000000000000000000"),
+    pipeline: list = [],
+    session=None,
+    options: dict = None,
+    page_size: int = 100,
+    parse_func: Callable[[list], Any] = None,
+    open_log: bool = False,
+    log_file: str = "./aggregate_by_page.log",
+    batch_size: int = None,
+):
+    """mongodb的聚合查询，具备分页查询功能，使用单个游标流式地读取数据。
+
+    Args:
+        coll: 目标Collection，异步客户端的Collection对象。
+        start_id(ObjectId): 起始ObjectId。
+        pipeline(list): 管道命令list，作用于整个数据流。
+        session: ClientSession对象。
+        options(dict): aggregate的options选项设置。eg: {"allowDiskUse": True}
+        page_size(int): 每页的数据条目数。
+        parse_func(Callable): 每一个page的数据的处理函数，可以是协程函数。需要自己实现。
+        open_log(bool): 是否开启日志，记录当前的Current ObjectId，
+            方便打断任务后，再次运行时扔给start_id。
+        log_file(str): 日志文件完整路径，open_log为True时需要填写，False可不填写。
+        batch_size(int): 游标每次从服务器获取的数据条目数。
+
+    Returns:
+        None
+    """
+
+    def wprint(log_msg):
+        print(log_msg)
+        if open_log:
+            log_file.write(log_msg + "\n")
+
+    if open_log:
+        log_file = open(log_file, "a+")
+
+    count = await coll.estimated_document_count()
+    page_total = (
+        int(count / page_size) if count % page_size == 0 else int(count / page_size) + 1
+    )
+    log_msg = "# the total page : {}".format(page_total)
+    print(log_msg)
+
+    current_page = 0
+    data_size = 0
+    total_time = time.time()
+    start_time = time.time()
+    async for data in iter_by_page(
+        coll, start_id, pipeline, session, options, page_size, batch_size
+    ):
+        log_msg = "# processing the page : {}".format(current_page)
+        wprint(log_msg)
+        # 更新 current_last_id，作为断点
+        current_last_id = data[-1]["_id"]
+        log_msg = "# current_last_id --> {}".format(current_last_id)
+        wprint(log_msg)
+        # 翻页
+        current_page += 1
+        # 处理数据
+        await _call_parse_func(parse_func, data)
+        data_size += len(data)
+        log_msg = "# elapsed time: {}s".format(time.time() - start_time)
+        wprint(log_msg)
+        log_msg = "*" * 36
+        wprint(log_msg)
+        start_time = time.time()
+
+    log_msg = "# the size of all processed data : --> {}\n".format(data_size)
+    log_msg += "# total time cost is : --> {}\n".format(time.time() - total_time)
+    log_msg += "# done."
+    wprint(log_msg)
+    if open_log:
+        log_file.close()
+
+
+async def split_id_ranges(
+    coll,
+    partition_num: int,
+    method: str = "sample",
+    sample_size: int = None,
+):
+    """将`_id`的取值范围划分为若干个区间，参数与返回值同`mongo.split_id_ranges`。"""
+    bounds = []
+    if partition_num > 1 and method == "sample":
+        sample_size = sample_size or partition_num * 100
+        cursor = await _maybe_await(
+            coll.aggregate(
+                [{"$sample": {"size": sample_size}}, {"$project": {"_id": 1}}]
+            )
+        )
+        ids = sorted(doc["_id"] for doc in await cursor.to_list(None))
+        bounds = gm._quantile_bounds(ids, partition_num)
+    elif partition_num > 1 and method == "timestamp":
+        first = await coll.find_one(sort=[("_id", 1)], projection={"_id": 1})
+        last = await coll.find_one(sort=[("_id", -1)], projection={"_id": 1})
+        if first is not None:
+            bounds = gm._timestamp_bounds(first["_id"], last["_id"], partition_num)
+    elif partition_num > 1 and method == "split_vector":
+        db = coll.database
+        size = (await db.command("collStats", coll.name))["size"]
+        result = await db.command(
+            "splitVector",
+            coll.full_name,
+            keyPattern={"_id": 1},
+            maxChunkSize=max(1, int(size / partition_num / 1024 / 1024)),
+        )
+        keys = [key["_id"] for key in result["splitKeys"]]
+        bounds = gm._quantile_bounds(keys, partition_num)
+    elif method not in ("sample", "timestamp", "split_vector"):
+        raise ValueError(
+            f"Unknown method: {method}, "
+            + "expected 'sample', 'timestamp' or 'split_vector'."
+        )
+    return gm._ranges_from_bounds(bounds)
+
+
+async def _process_page(
+    parse_func: Callable[[list], Any], data: list, checkpoint: str, last_id: Any
+):
+    """处理一页数据，然后在线程池中更新断点。"""
+    await _call_parse_func(parse_func, data)
+    if checkpoint is not None:
+        await _run_in_thread(
+            gm._save_checkpoint, checkpoint, {"last": last_id, "done": False}
+        )
+
+
+async def _scan_partition(
+    index: int,
+    coll,
+    start_id: Any,
+    end_id: Any,
+    parse_func: Callable[[list], Any],
+    pipeline: list,
+    options: dict,
+    page_size: int,
+    batch_size: int,
+    checkpoint_dir: str,
+):
+    """
+    扫描一个`_id`区间；每处理完一页就在线程池中更新该区间的断点。
+    被取消时(其他区间出错)，处理完当前页并保存断点后才停止，与同步版本相同。
+    """
+    checkpoint = None
+    if checkpoint_dir is not None:
+        checkpoint = os.path.join(checkpoint_dir, f"partition_{index}.json")
+        state = await _run_in_thread(gm._load_checkpoint, checkpoint)
+        if state is not None:
+            if state["done"]:
+                return 0
+            start_id = state["last"]
+
+    data_size = 0
+    async for data in iter_by_page(
+        coll, start_id, pipeline, None, options, page_size, batch_size, end_id
+    ):
+        step = asyncio.ensure_future(
+            _process_page(parse_func, data, checkpoint, data[-1]["_id"])
+        )
+        try:
+            await asyncio.shield(step)
+        except asyncio.CancelledError:
+            await step
+            raise
+        data_size += len(data)
+        start_id = data[-1]["_id"]
+    if checkpoint is not None:
+        await _run_in_thread(
+            gm._save_checkpoint, checkpoint, {"last": start_id, "done": True}
+        )
+    print("# partition {} done, size : {}".format(index, data_size))
+    return data_size
+
+
+async def scan_by_partition(
+    coll,
+    parse_func: Callable[[list], Any],
+    partition_num: int = 4,
+    pipeline: list = None,
+    options: dict = None,
+    page_size: int = 100,
+    batch_size: int = None,
+    split_method: str = "sample",
+    checkpoint_dir: str = None,
+):
+    """将`_id`划分为若干个区间，在同一个事件循环中并发地扫描整个Collection。
+
+    与`mongo.scan_by_partition`相同，只是各区间由协程并发扫描，共用一个客户端的连接池；
+    断点文件的格式也相同。
+
+    Args:
+        coll: 目标Collection，异步客户端的Collection对象。
+        parse_func(Callable): 每一个page的数据的处理函数，可以是协程函数。需要自己实现。
+        partition_num(int): 区间数目，也是并发扫描的协程数目。
+        pipeline(list): 管道命令list，默认为None，使用find查询。
+        options(dict): aggregate的options选项设置。eg: {"allowDiskUse": True}
+        page_size(int): 每页的数据条目数。
+        batch_size(int): 游标每次从服务器获取的数据条目数。
+        split_method(str): 区间划分方法，参见`mongo.split_id_ranges`。
+        checkpoint_dir(str): 断点文件的目录，默认为None，不保存断点。
+
+    Returns:
+        int: 处理的数据条目数。
+    """
+    ranges = None
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        partitions_file = os.path.join(checkpoint_dir, "partitions.json")
+        ranges = await _run_in_thread(gm._load_checkpoint, partitions_file)
+    if ranges is None:
+        ranges = await split_id_ranges(coll, partition_num, split_method)
+        if checkpoint_dir is not None:
+            await _run_in_thread(gm._save_checkpoint, partitions_file, ranges)
+    print("# the number of partitions : {}".format(len(ranges)))
+
+    total_time = time.time()
+    tasks = [
+        asyncio.ensure_future(
+            _scan_partition(
+                index,
+                coll,
+                start_id,
+                end_id,
+                parse_func,
+                pipeline,
+                options,
+                page_size,
+                batch_size,
+                checkpoint_dir,
+            )
+        )
+        for index, (start_id, end_id) in enumerate(ranges)
+    ]
+    try:
+        sizes = await asyncio.gather(*tasks)
+    except BaseException:
+        # 任何一个区间出错时，取消其他区间的扫描，并等待它们保存断点
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    data_size = sum(sizes)
+    print("# the size of all processed data : --> {}".format(data_size))
+    print("# total time cost is : --> {}".format(time.time() - total_time))
+    return data_size
@@ -8,18 +8,127 @@
 # @Description :  some useful functions of indexes or indicators that measure
 #                   the degree of diversity.
 
-__version__ = "0.2.5"
+__version__ = "0.3.3"
 
 import math
 from itertools import combinations
 from typing import List, Tuple, Union
 
 import numpy as np
-from pandas import DataFrame
+from pandas import DataFrame, Series
+from scipy import sparse
+from scipy.special import gammaln
+
+
+class CategoryDistance:
+    """预先建立索引的学科类目距离矩阵.
+
+    固定 学科类目名称→行号 的映射，只在创建时把相似度转换为距离一次，
+    距离保存在连续的 ndarray 中，计算指标时按下标取值，避免在循环中对 DataFrame 按标签检索.
+    本模块中所有接收 `cosine` 参数的函数都可以直接传入该对象，此时忽略 `cosine_type`.
+
+    example:
+        ```python
+        cd = CategoryDistance(cosine_df)
+        calculate_RS_TD_indicator(fields, cd)
+        calculate_RS_TD_batch(cd.fields_matrix(papers), cd)
+        ```
+
+    Parameters
+    ----------
+    cosine : DataFrame or np.ndarray
+        余弦相似度/余弦距离矩阵，DataFrame 按 `cosine[name_one][name_two]` 取值.
+    labels : list
+        学科类目名称，默认为None，使用 DataFrame 的列名；`cosine`为 ndarray 时必须指定.
+    cosine_type : str
+        默认为's'，表示`cosine`是余弦相似度，'d' 表示余弦距离.
+    dtype : np.dtype
+        距离矩阵的数据类型，np.float64 或 np.float32.
+    """
+
+    def __init__(
+        self,
+        cosine: Union[DataFrame, np.ndarray],
+        labels: List = None,
+        cosine_type: str = "s",
+        dtype=np.float64,
+    ):
+        if isinstance(cosine, DataFrame):
+            labels = list(cosine.columns) if labels is None else list(labels)
+            # cosine[name_one][name_two] 即 cosine.loc[name_two, name_one]
+            values = cosine.loc[labels, labels].to_numpy().T
+        elif labels is None:
+            raise Exception("labels is required when cosine is not a DataFrame.")
+        else:
+            values = cosine
+
+        self.labels = list(labels)
+        self.index = {label: idx for idx, label in enumerate(self.labels)}
+        self.distance = np.ascontiguousarray(
+            _as_distance_array(values, cosine_type), dtype=dtype
+        )
+
+    def __len__(self):
+        return len(self.labels)
+
+    def indices(self, labels: List) -> np.ndarray:
+        """学科类目名称对应的行号."""
+        return np.array([self.index[label] for label in labels], dtype=np.int64)
+
+    def submatrix(self, labels: List) -> np.ndarray:
+        """学科类目两两之间的距离矩阵，行列顺序与 `labels` 一致."""
+        idx = self.indices(labels)
+        return self.distance[np.ix_(idx, idx)]
+
+    def fields_matrix(self, papers: List[List[Tuple]]):
+        """把多篇论文的 `fields` 转换为 论文×学科类目 的 CSR 矩阵，列的顺序与 `labels` 一致.
+
+        Parameters
+        ----------
+        papers : List[List[Tuple]]
+            每篇论文的 fields，元素为tuple [学科类目,次数或百分比].
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix:
+            可以直接传给 `calculate_RS_TD_batch` 等批量计算函数.
+        """
+        indptr = [0]
+        indices = list()
+        values = list()
+        for fields in papers:
+            for name, value in fields:
+                indices.append(self.index[name])
+                values.append(value)
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (
+                np.asarray(values, dtype=np.float64),
+                np.asarray(indices, dtype=np.int64),
+                np.asarray(indptr, dtype=np.int64),
+            ),
+            shape=(len(papers), len(self.labels)),
+        )
+
+
+def _fields_pair_distances(fields: List, cosine: CategoryDistance) -> np.ndarray:
+    """fields 中学科类目两两组合（前一个与后一个）的距离，与 combinations 的顺序一致."""
+    sub = cosine.submatrix([field[0] for field in fields])
+    return sub[np.triu_indices(len(fields), k=1)]
+
+
+def _fields_pair_products(fields: List) -> np.ndarray:
+    """fields 中两两组合的数值乘积，与 combinations 的顺序一致."""
+    values = np.array([field[1] for field in fields], dtype=np.float64)
+    rows, cols = np.triu_indices(len(fields), k=1)
+    return values[rows] * values[cols]
 
 
 def calculate_DIV(
-    fields: list, cosine: DataFrame, N: int, balance: int or float
+    fields: list,
+    cosine: Union[DataFrame, CategoryDistance],
+    N: int,
+    balance: int or float,
 ) -> Tuple:
     """计算跨学科指标 `DIV` 和 `DIV*`.
 
@@ -27,8 +136,8 @@ def calculate_DIV(
     ----------
     fields : list
         元祖类型，第一个元素是category name, 第二个元素是次数.
-    cosine : DataFrame
-        余弦相似度矩阵.
+    cosine : DataFrame or CategoryDistance
+        余弦相似度矩阵，或者预先建立索引的 `CategoryDistance`.
     N : int
         整个数据中，使用的学科的总的类目数，例如，使用了252个学科类目.
     balance : int or float
@@ -40,17 +149,20 @@ def calculate_DIV(
         (`DIV`, `DIV*`)
     """
 
-    pairs = combinations(fields, 2)
-
-    dij_list = []
-    for one, two in pairs:
-        # 学科类目的名称
-        idx_one = one[0]
-        idx_two = two[0]
-        # 拿出来相似度，再用1减去，得到不相似度，即学科之间的距离，即dij
-        d = 1 - cosine[idx_one][idx_two]
-        # 计算
-        dij_list.append(d)
+    if isinstance(cosine, CategoryDistance):
+        dij_list = _fields_pair_distances(fields, cosine).tolist()
+    else:
+        pairs = combinations(fields, 2)
+
+        dij_list = []
+        for one, two in pairs:
+            # 学科类目的名称
+            idx_one = one[0]
+            idx_two = two[0]
+            # 拿出来相似度，再用1减去，得到不相似度，即学科之间的距离，即dij
+            d = 1 - cosine[idx_one][idx_two]
+            # 计算
+            dij_list.append(d)
 
     # Variety 就是公式中的nc，学科类目的数目
     V = len(fields)
@@ -69,7 +181,9 @@ def calculate_DIV(
 
 
 def calculate_RS_TD_indicator(
-    fields: List, cosine: DataFrame, cosine_type: str = "s"
+    fields: List,
+    cosine: Union[DataFrame, CategoryDistance],
+    cosine_type: str = "s",
 ) -> Tuple:
     """
     计算 Rao-stirling、True Diversity指标.
@@ -78,8 +192,8 @@ def calculate_RS_TD_indicator(
     ----------
     fields : List
         元素为tuple [学科类目,百分比]，学科类目用来检索相似度，百分比用来计算指标.
-    cosine : DataFrame
-        余弦距离/余弦相似度矩阵.
+    cosine : DataFrame or CategoryDistance
+        余弦距离/余弦相似度矩阵，或者预先建立索引的 `CategoryDistance`.
     cosine_type : str
         默认为's'，表示`cosine`是余弦相似度，'d' 表示余弦距离.
 
@@ -88,6 +202,14 @@ def calculate_RS_TD_indicator(
     Tuple:
         (`Rao-stirling`, `True Diversity`)
     """
+    if isinstance(cosine, CategoryDistance):
+        p = _fields_pair_products(fields)
+        d = _fields_pair_distances(fields, cosine)
+        RS = float(np.sum(p * d))
+        TDs_sum = float(np.sum(p * (1 - d)))
+        TD = 1 / TDs_sum if TDs_sum != 0 else 0
+        return RS, TD
+
     pairs = combinations(fields, 2)
 
     RSs = []
@@ -114,19 +236,184 @@ def calculate_RS_TD_indicator(
     return RS, TD
 
 
-def gini_coefficient(data: Union[List, np.array]):
-    """计算 `Gini Coefficient`."""
+def gini_coefficient(
+    data: Union[List, np.array], weights: Union[List, np.array] = None
+):
+    """计算 `Gini Coefficient`.
 
-    sorted_list = sorted(data)
-    height, area = 0, 0
-    for value in sorted_list:
-        height += value
-        area += height - value / 2.0
-    fair_area = height * len(data) / 2.0
+    Args:
+        data(list or np.array): 数值
+        weights(list or np.array): 默认为None；每个数值的权重，权重为w相当于该数值重复出现w次
+
+    Returns:
+        float: Gini Coefficient
+    """
+    values = np.asarray(data, dtype=np.float64)
+    order = np.argsort(values, kind="stable")
+    values = values[order]
+    if weights is None:
+        weights = np.ones_like(values)
+    else:
+        weights = np.asarray(weights, dtype=np.float64)[order]
+
+    # height 为累计高度，area 为洛伦兹曲线下的面积
+    wv = weights * values
+    height = np.cumsum(wv)
+    total = float(height[-1]) if len(height) > 0 else 0.0
+    area = float(np.sum(weights * (height - wv / 2.0)))
+    fair_area = total * float(np.sum(weights)) / 2.0
 
     return (fair_area - area) / fair_area
 
 
+def gini_coefficient_by_group(
+    values: Union[List, np.ndarray],
+    groups: Union[List, np.ndarray],
+    weights: Union[List, np.ndarray] = None,
+) -> Series:
+    """一次计算多个分组（如每个期刊、每个年份）的 `Gini Coefficient`.
+
+    所有数据只排序一次，各组的累计和用 cumsum 减去组的起点得到，复杂度为 O(n log n).
+    `1 - Gini` 可以作为 `calculate_DIV_batch` 的 `balance` 参数.
+
+    Args:
+        values(list or np.ndarray): 数值
+        groups(list or np.ndarray): 每个数值所属的分组id，长度与 values 相同
+        weights(list or np.ndarray): 默认为None；每个数值的权重
+
+    Returns:
+        Series: 以分组id为索引的 Gini Coefficient，总和为0的分组为 nan
+    """
+    values = np.asarray(values, dtype=np.float64)
+    labels, codes = np.unique(np.asarray(groups), return_inverse=True)
+    codes = codes.ravel()
+    weights = (
+        np.ones_like(values)
+        if weights is None
+        else np.asarray(weights, dtype=np.float64)
+    )
+
+    # 先按分组、再按数值排序
+    order = np.lexsort((values, codes))
+    values, codes, weights = values[order], codes[order], weights[order]
+
+    n = len(labels)
+    wv = weights * values
+    group_total = np.bincount(codes, weights=wv, minlength=n)
+    group_offset = np.cumsum(group_total) - group_total
+    height = np.cumsum(wv) - group_offset[codes]
+
+    area = np.bincount(codes, weights=weights * (height - wv / 2.0), minlength=n)
+    fair_area = group_total * np.bincount(codes, weights=weights, minlength=n) / 2.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gini = (fair_area - area) / fair_area
+
+    return Series(gini, index=labels)
+
+
+def gini_coefficient_batch(counts) -> np.ndarray:
+    """批量计算 对象×类目 次数矩阵每一行非0元素的 `Gini Coefficient`.
+
+    Args:
+        counts: scipy.sparse 矩阵或者二维数组
+
+    Returns:
+        np.ndarray: 每一行的 Gini Coefficient，没有非0元素的行为 nan
+    """
+    n, rows, data, N = _row_counts(counts)
+    gini = np.full(n, np.nan)
+    by_group = gini_coefficient_by_group(data, rows)
+    gini[by_group.index.to_numpy()] = by_group.to_numpy()
+    return gini
+
+
+class GiniAccumulator:
+    """`Gini Coefficient` 的流式近似计算，适用于无法一次性放入内存的数据.
+
+    按照固定的区间边界累加每个区间的权重和数值和，内存占用只与区间数目有关；
+    计算时把每个区间看作取值为区间均值的一组数据，忽略区间内部的差异，
+    区间越细，误差越小. 使用相同区间边界的累加器可以通过 `merge` 合并.
+
+    example:
+        ```python
+        acc = GiniAccumulator(low=1, high=1e6, bins=2000, log=True)
+        gf.read_txt_by_page("citations.txt", lambda lines: acc.update([float(x) for x in lines]))
+        acc.result()
+        ```
+
+    Args:
+        low(float): 区间的下界，小于下界的数值计入第一个区间
+        high(float): 区间的上界，大于上界的数值计入最后一个区间
+        bins(int): 区间数目
+        log(bool): 默认为False，等宽区间；True 表示按对数等分，适合长尾分布，此时 low 需要大于0
+        edges(np.ndarray): 默认为None；指定时直接作为区间边界，忽略 low、high、bins、log
+    """
+
+    def __init__(
+        self,
+        low: float = 0.0,
+        high: float = 1.0,
+        bins: int = 1000,
+        log: bool = False,
+        edges: np.ndarray = None,
+    ):
+        if edges is None:
+            edges = (
+                np.logspace(np.log10(low), np.log10(high), bins + 1)
+                if log
+                else np.linspace(low, high, bins + 1)
+            )
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.weights = np.zeros(len(self.edges) - 1, dtype=np.float64)
+        self.sums = np.zeros(len(self.edges) - 1, dtype=np.float64)
+
+    def update(self, values: Union[List, np.ndarray], weights=None):
+        """累加一批数值.
+
+        Args:
+            values(list or np.ndarray): 数值
+            weights(list or np.ndarray): 默认为None；每个数值的权重
+
+        Returns:
+            GiniAccumulator: self
+        """
+        values = np.asarray(values, dtype=np.float64)
+        weights = (
+            np.ones_like(values)
+            if weights is None
+            else np.asarray(weights, dtype=np.float64)
+        )
+        idx = np.clip(
+            np.searchsorted(self.edges, values, side="right") - 1,
+            0,
+            len(self.weights) - 1,
+        )
+        self.weights += np.bincount(idx, weights=weights, minlength=len(self.weights))
+        self.sums += np.bincount(
+            idx, weights=weights * values, minlength=len(self.weights)
+        )
+        return self
+
+    def merge(self, other: "GiniAccumulator"):
+        """合并另一个使用相同区间边界的累加器.
+
+        Returns:
+            GiniAccumulator: self
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise Exception("the edges of the two accumulators should be the same.")
+        self.weights += other.weights
+        self.sums += other.sums
+        return self
+
+    def result(self) -> float:
+        """Gini Coefficient 的近似值."""
+        mask = self.weights > 0
+        return gini_coefficient(
+            self.sums[mask] / self.weights[mask], self.weights[mask]
+        )
+
+
 def category_count(data: list):
     """学科数量丰富度`Variety`，即`category count`（MacArthur 1965）.
 
@@ -139,15 +426,17 @@ def category_count(data: list):
     return len(data)
 
 
-def calculate_disparity(fields: list, cosine: DataFrame, N: int) -> float:
+def calculate_disparity(
+    fields: list, cosine: Union[DataFrame, CategoryDistance], N: int
+) -> float:
     """学科差异度：（Weizman(1992a)、Solow & Polasky(1994a).
 
     Parameters
     ----------
     fields : list
         元素是元祖类型,第一个元素是`category name`, 第二个元素是次数或百分比.
-    cosine : DataFrame
-        余弦相似度矩阵.
+    cosine : DataFrame or CategoryDistance
+        余弦相似度矩阵，或者预先建立索引的 `CategoryDistance`.
     N : int
         整个数据中，使用的学科的总的类目数，例如，使用了252个学科类目.
 
@@ -156,16 +445,19 @@ def calculate_disparity(fields: list, cosine: DataFrame, N: int) -> float:
     float:
         差异性指标值.
     """
-    pairs = combinations(fields, 2)
-    dij_list = []
-    for one, two in pairs:
-        # 学科类目的名称
-        idx_one = one[0]
-        idx_two = two[0]
-        # 拿出来相似度，再用1减去，得到不相似度，即学科之间的距离，即dij
-        d = 1 - cosine[idx_one][idx_two]
-        # 计算
-        dij_list.append(d)
+    if isinstance(cosine, CategoryDistance):
+        dij_list = _fields_pair_distances(fields, cosine).tolist()
+    else:
+        pairs = combinations(fields, 2)
+        dij_list = []
+        for one, two in pairs:
+            # 学科类目的名称
+            idx_one = one[0]
+            idx_two = two[0]
+            # 拿出来相似度，再用1减去，得到不相似度，即学科之间的距离，即dij
+            d = 1 - cosine[idx_one][idx_two]
+            # 计算
+            dij_list.append(d)
 
     # 计算 disparity
     V = len(fields)
@@ -299,6 +591,343 @@ def brillouin_diversity_index(data: list):
     return H
 
 
+def _as_distance_array(cosine, cosine_type: str = "s") -> np.ndarray:
+    """把余弦相似度/余弦距离矩阵转换为 float64 的距离矩阵（ndarray）.
+
+    `CategoryDistance` 直接返回其距离矩阵.
+    """
+    if isinstance(cosine, CategoryDistance):
+        return cosine.distance
+    values = cosine.to_numpy() if isinstance(cosine, DataFrame) else cosine
+    values = np.asarray(values, dtype=np.float64)
+    if cosine_type == "s":
+        return 1 - values
+    elif cosine_type == "d":
+        return values
+    else:
+        raise Exception("cosine_type's value should be 's' or 'd'.")
+
+
+def _as_matrix(data):
+    """稀疏矩阵转换为 CSR，其他类型转换为 float64 的 ndarray."""
+    if sparse.issparse(data):
+        return sparse.csr_matrix(data, dtype=np.float64)
+    return np.asarray(data, dtype=np.float64)
+
+
+def _presence(matrix):
+    """把次数矩阵转换为 0/1 矩阵，1 表示该学科类目出现过."""
+    if sparse.issparse(matrix):
+        matrix = matrix.copy()
+        matrix.data = (matrix.data != 0).astype(np.float64)
+        matrix.eliminate_zeros()
+        return matrix
+    return (matrix != 0).astype(np.float64)
+
+
+def _pair_sums(matrix, distance: np.ndarray, block_size: int = 10000) -> np.ndarray:
+    """对矩阵的每一行 x，计算所有学科类目两两组合的 `x_i * x_j * d_ij` 之和.
+
+    即 `(x^T D x - sum(x_i^2 * d_ii)) / 2`，要求 D 是对称矩阵；
+    分块计算，每块占用 block_size×类目数 个浮点数的内存.
+    """
+    n = matrix.shape[0]
+    diag = np.diag(distance)
+    result = np.empty(n, dtype=np.float64)
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        block = matrix[start:end]
+        Q = np.asarray(block @ distance)
+        if sparse.issparse(block):
+            quad = np.asarray(block.multiply(Q).sum(axis=1)).ravel()
+            self_ = np.asarray(block.multiply(block) @ diag).ravel()
+        else:
+            quad = (block * Q).sum(axis=1)
+            self_ = (block**2) @ diag
+        result[start:end] = (quad - self_) / 2
+    return result
+
+
+def calculate_RS_TD_batch(
+    proportions,
+    cosine: Union[DataFrame, np.ndarray, CategoryDistance],
+    cosine_type: str = "s",
+    block_size: int = 10000,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量计算 Rao-stirling、True Diversity指标，结果与逐篇调用 `calculate_RS_TD_indicator` 相同.
+
+    Parameters
+    ----------
+    proportions : scipy.sparse matrix or np.ndarray
+        论文×学科类目 的百分比矩阵，列的顺序与 `cosine` 的行列顺序一致.
+    cosine : DataFrame or np.ndarray or CategoryDistance
+        余弦距离/余弦相似度矩阵，需要是对称矩阵.
+    cosine_type : str
+        默认为's'，表示`cosine`是余弦相似度，'d' 表示余弦距离.
+    block_size : int
+        每次计算的论文数目，用来限制内存占用.
+
+    Returns
+    -------
+    Tuple:
+        (`Rao-stirling`, `True Diversity`)，均为长度等于论文数目的 np.ndarray
+    """
+    P = _as_matrix(proportions)
+    D = _as_distance_array(cosine, cosine_type)
+
+    RS = _pair_sums(P, D, block_size)
+    TDs_sum = _pair_sums(P, 1 - D, block_size)
+    TD = np.divide(1, TDs_sum, out=np.zeros_like(TDs_sum), where=TDs_sum != 0)
+
+    return RS, TD
+
+
+def calculate_DIV_batch(
+    counts,
+    cosine: Union[DataFrame, np.ndarray, CategoryDistance],
+    N: int,
+    balance: Union[np.ndarray, float],
+    cosine_type: str = "s",
+    block_size: int = 10000,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """批量计算跨学科指标 `DIV` 和 `DIV*`，结果与逐篇调用 `calculate_DIV` 相同.
+
+    Parameters
+    ----------
+    counts : scipy.sparse matrix or np.ndarray
+        论文×学科类目 的次数矩阵，非0的元素表示该学科类目出现过.
+    cosine : DataFrame or np.ndarray or CategoryDistance
+        余弦相似度矩阵，需要是对称矩阵.
+    N : int
+        整个数据中，使用的学科的总的类目数，例如，使用了252个学科类目.
+    balance : np.ndarray or float
+        每篇论文的均匀度，通常用`1-Gini`的值作为均匀度.
+    cosine_type : str
+        默认为's'，表示`cosine`是余弦相似度，'d' 表示余弦距离.
+    block_size : int
+        每次计算的论文数目，用来限制内存占用.
+
+    Returns
+    -------
+    Tuple:
+        (`DIV`, `DIV*`)，学科类目数目小于2的论文，`DIV`为0
+    """
+    B = _presence(_as_matrix(counts))
+    D = _as_distance_array(cosine, cosine_type)
+
+    V = np.asarray(B.sum(axis=1), dtype=np.float64).ravel()
+    dij_list_sum = _pair_sums(B, D, block_size)
+    balance = np.asarray(balance, dtype=np.float64)
+
+    pairs = V * (V - 1)
+    div1 = np.divide(
+        (V / N) * balance * dij_list_sum,
+        pairs,
+        out=np.zeros_like(dij_list_sum),
+        where=pairs != 0,
+    )
+    div2 = V * balance * dij_list_sum
+
+    return div1, div2
+
+
+def calculate_disparity_batch(
+    counts,
+    cosine: Union[DataFrame, np.ndarray, CategoryDistance],
+    cosine_type: str = "s",
+    block_size: int = 10000,
+) -> np.ndarray:
+    """批量计算学科差异度，结果与逐篇调用 `calculate_disparity` 相同.
+
+    Parameters
+    ----------
+    counts : scipy.sparse matrix or np.ndarray
+        论文×学科类目 的次数或百分比矩阵，非0的元素表示该学科类目出现过.
+    cosine : DataFrame or np.ndarray or CategoryDistance
+        余弦相似度矩阵，需要是对称矩阵.
+    cosine_type : str
+        默认为's'，表示`cosine`是余弦相似度，'d' 表示余弦距离.
+    block_size : int
+        每次计算的论文数目，用来限制内存占用.
+
+    Returns
+    -------
+    np.ndarray:
+        差异性指标值，学科类目数目小于2的论文为0.
+    """
+    B = _presence(_as_matrix(counts))
+    D = _as_distance_array(cosine, cosine_type)
+
+    V = np.asarray(B.sum(axis=1), dtype=np.float64).ravel()
+    dij_list_sum = _pair_sums(B, D, block_size)
+
+    pairs = V * (V - 1)
+    return np.divide(
+        dij_list_sum, pairs, out=np.zeros_like(dij_list_sum), where=pairs != 0
+    )
+
+
+def _row_counts(counts):
+    """把 对象×类目 的次数矩阵整理为按行计算所需的数据.
+
+    Returns
+    -------
+    Tuple:
+        (行数, 每个非0元素所在的行号, 非0元素的值, 每行的总数)
+    """
+    matrix = sparse.csr_matrix(counts, dtype=np.float64)
+    matrix.eliminate_zeros()
+    n = matrix.shape[0]
+    rows = np.repeat(np.arange(n), np.diff(matrix.indptr))
+    data = matrix.data
+    N = np.bincount(rows, weights=data, minlength=n)
+    return n, rows, data, N
+
+
+def _safe_divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """a / b，b 为0的位置结果为0."""
+    return np.divide(a, b, out=np.zeros_like(a, dtype=np.float64), where=b != 0)
+
+
+def category_count_batch(counts) -> np.ndarray:
+    """批量计算每一行的学科数量丰富度`Variety`，即非0的类目数目.
+
+    Args:
+        counts: 对象×类目 的次数矩阵，scipy.sparse 矩阵或者二维数组
+
+    Returns:
+        np.ndarray: 每一行的类目数目
+    """
+    n, rows, data, N = _row_counts(counts)
+    return np.bincount(rows, minlength=n)
+
+
+def shannon_index_batch(counts) -> np.ndarray:
+    """批量计算每一行的 Shannon Diversity Index，见 `shannon_index`.
+
+    Args:
+        counts: 对象×类目 的次数矩阵，scipy.sparse 矩阵或者二维数组
+
+    Returns:
+        np.ndarray: 每一行的 Shannon Diversity Index
+    """
+    n, rows, data, N = _row_counts(counts)
+    p = data / N[rows]
+    return -np.bincount(rows, weights=p * np.log(p), minlength=n)
+
+
+def shannon_evenness_batch(counts) -> np.ndarray:
+    """批量计算每一行的 Shannon evenness，见 `shannon_evenness`.
+
+    与 `shannon_evenness` 用列表长度作为类目数不同，这里的类目数是每一行中非0的类目数目，
+    矩阵中补齐的0不参与计算.
+
+    Args:
+        counts: 对象×类目 的次数矩阵，scipy.sparse 矩阵或者二维数组
+
+    Returns:
+        np.ndarray: 每一行的 Shannon evenness，只有一个类目的行为0
+    """
+    n, rows, data, N = _row_counts(counts)
+    p = data / N[rows]
+    si = -np.bincount(rows, weights=p * np.log(p), minlength=n)
+    h_max = np.log(np.maximum(np.bincount(rows, minlength=n), 1))
+    return _safe_divide(si, h_max)
+
+
+def simpson_index_batch(counts) -> np.ndarray:
+    """批量计算每一行的 Simpson Index，见 `simpson_index`.
+
+    Args:
+        counts: 对象×类目 的次数矩阵，scipy.sparse 矩阵或者二维数组
+
+    Returns:
+        np.ndarray: 每一行的 Simpson Index
+    """
+    n, rows, data, N = _row_counts(counts)
+    p = data / N[rows]
+    return np.bincount(rows, weights=p**2, minlength=n)
+
+
+def inverse_simpson_index_batch(counts) -> np.ndarray:
+    """批量计算每一行的 Inverse Simpson Index，见 `inverse_simpson_index`.
+
+    Args:
+        counts: 对象×类目 的次数矩阵，scipy.sparse 矩阵或者二维数组
+
+    Returns:
+        np.ndarray: 每一行的 Inverse Simpson Index
+    """
+    si = simpson_index_batch(counts)
+    return _safe_divide(np.ones_like(si), si)
+
+
+def gini_simpson_index_batch(counts) -> np.ndarray:
+    """批量计算每一行的 Gini-Simpson Index，见 `gini_simpson_index`.
+
+    Args:
+        counts: 对象×类目 的次数矩阵，scipy.sparse 矩阵或者二维数组
+
+    Returns:
+        np.ndarray: 每一行的 Gini-Simpson Index
+    """
+    return 1 - simpson_index_batch(counts)
+
+
+def brillouin_diversity_index_batch(counts) -> np.ndarray:
+    """批量计算每一行的布里渊多样性指数，见 `brillouin_diversity_index`.
+
+    阶乘的对数用 `gammaln` 计算，次数很大时也不会溢出.
+
+    Args:
+        counts: 对象×类目 的次数矩阵，scipy.sparse 矩阵或者二维数组
+
+    Returns:
+        np.ndarray: 每一行的 brillouin index
+    """
+    n, rows, data, N = _row_counts(counts)
+    A = gammaln(N + 1) / np.log(10)
+    B = np.bincount(rows, weights=gammaln(data + 1), minlength=n) / np.log(10)
+    return _safe_divide(A - B, N)
+
+
+def diversity_profile(counts, index: List = None) -> DataFrame:
+    """一次计算 次数矩阵 每一行的全部多样性指数.
+
+    Args:
+        counts: 对象×类目 的次数矩阵，scipy.sparse 矩阵或者二维数组，
+            例如 期刊年份×学科类目 的次数矩阵
+        index (list): 结果的行索引，默认为None，使用行号
+
+    Returns:
+        DataFrame: 每一行对应一个对象，列为 category_count、shannon_index、
+            shannon_evenness、simpson_index、inverse_simpson_index、
+            gini_simpson_index、brillouin_diversity_index
+    """
+    n, rows, data, N = _row_counts(counts)
+    p = data / N[rows]
+
+    variety = np.bincount(rows, minlength=n)
+    si = -np.bincount(rows, weights=p * np.log(p), minlength=n)
+    simpson = np.bincount(rows, weights=p**2, minlength=n)
+    A = gammaln(N + 1)
+    B = np.bincount(rows, weights=gammaln(data + 1), minlength=n)
+
+    return DataFrame(
+        {
+            "category_count": variety,
+            "shannon_index": si,
+            "shannon_evenness": _safe_divide(si, np.log(np.maximum(variety, 1))),
+            "simpson_index": simpson,
+            "inverse_simpson_index": _safe_divide(np.ones_like(simpson), simpson),
+            "gini_simpson_index": 1 - simpson,
+            "brillouin_diversity_index": _safe_divide(A - B, N) / np.log(10),
+        },
+        index=index,
+    )
+
+
 #  if __name__ == "__main__":
 #
 #      data = [10, 20, 30]
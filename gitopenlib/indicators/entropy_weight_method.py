@@ -7,15 +7,40 @@
 # @Date   :  2021-04-01 15:01:56
 # @Description :  熵权法，计算指标的权重
 
-__version__ = "0.2.0"
+__version__ = "0.3.2"
 
-import math
+from typing import Callable, Iterable
 
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
 
+def _plogp_sums(y: np.ndarray):
+    """每列的 `Σy` 和 `Σy·ln(y)`，其中 0·ln0 记为0，空值(NaN)不参与累加。"""
+    log_y = np.zeros_like(y)
+    np.log(y, out=log_y, where=y > 0)
+    return (
+        np.nansum(y, axis=0, dtype=np.float64),
+        np.nansum(y * log_y, axis=0, dtype=np.float64),
+    )
+
+
+def _column_entropy(y_sum: np.ndarray, ylogy_sum: np.ndarray, m: int):
+    """由每列的 `Σy` 和 `Σy·ln(y)` 求熵值。
+
+    p = y / Σy，所以 Σp·ln(p) = Σy·ln(y) / Σy - ln(Σy)，
+    熵值 e_j = -1/ln(m) * Σp·ln(p)，m 为行数。
+    Σy 为0的列(如取值都相同的指标)没有区分度，熵值记为1，权重为0。
+    """
+    y_sum = np.asarray(y_sum, dtype=np.float64)
+    ylogy_sum = np.asarray(ylogy_sum, dtype=np.float64)
+    e = np.ones_like(y_sum)
+    valid = y_sum > 0
+    e[valid] = -(ylogy_sum[valid] / y_sum[valid] - np.log(y_sum[valid])) / np.log(m)
+    return e
+
+
 class EntropyValueMethod:
     """使用熵权法计算指标的权重(Method 2)
 
@@ -30,16 +55,91 @@ class EntropyValueMethod:
         ]
         scores = evm.calculate_scores()
         ```
+
+    数据量很大时，可以分块累加，不必一次读入整个矩阵；
+    每块只需累加行数、每列的 `Σx` 和 `Σx·ln(x)`，
+    多个进程各自累加后用 `merge` 合并即可：
+        ```python
+        evm = EntropyValueMethod()
+        for chunk in chunks:
+            evm.partial_fit(chunk)
+        weights = evm.finalize()
+        scores = evm.score(chunk)
+        ```
     """
 
-    def __init__(self, data):
+    def __init__(self, data=None):
         self.data = data
+        self.m = 0
+        self._x_sum = None
+        self._xlogx_sum = None
+
+    def partial_fit(self, chunk):
+        """累加一块数据(若干行)的统计量。
+
+        Args:
+            chunk (np.ndarray or DataFrame or list): 二维数据，每行一个对象，每列一个指标。
+
+        Returns:
+            EntropyValueMethod: self，便于链式调用。
+        """
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if chunk.ndim == 1:
+            chunk = chunk.reshape(1, -1)
+        if chunk.shape[0] == 0:
+            return self
+        x_sum, xlogx_sum = _plogp_sums(chunk)
+        if self._x_sum is None:
+            self._x_sum, self._xlogx_sum = x_sum, xlogx_sum
+        elif len(x_sum) != len(self._x_sum):
+            raise ValueError(f"Expected {len(self._x_sum)} columns, got {len(x_sum)}.")
+        else:
+            self._x_sum = self._x_sum + x_sum
+            self._xlogx_sum = self._xlogx_sum + xlogx_sum
+        self.m += chunk.shape[0]
+        return self
+
+    def merge(self, other: "EntropyValueMethod"):
+        """合并另一个 `EntropyValueMethod` 累加的统计量，用于多进程分块计算。
+
+        Returns:
+            EntropyValueMethod: self，便于链式调用。
+        """
+        if other._x_sum is None:
+            return self
+        if self._x_sum is None:
+            self._x_sum = other._x_sum.copy()
+            self._xlogx_sum = other._xlogx_sum.copy()
+        elif len(other._x_sum) != len(self._x_sum):
+            raise ValueError(
+                f"Expected {len(self._x_sum)} columns, got {len(other._x_sum)}."
+            )
+        else:
+            self._x_sum = self._x_sum + other._x_sum
+            self._xlogx_sum = self._xlogx_sum + other._xlogx_sum
+        self.m += other.m
+        return self
+
+    def finalize(self):
+        """由累加的统计量计算各指标的熵值和权重。
+
+        Returns:
+            np.ndarray: 各指标的权重，熵值保存在 `self.e_j` 中。
+        """
+        if self._x_sum is None:
+            raise ValueError("No data, call partial_fit first.")
+        self.e_j = _column_entropy(self._x_sum, self._xlogx_sum, self.m)
+        d_j = 1 - self.e_j
+        self.W_j = d_j / d_j.sum()
+        return self.W_j
+
+    def score(self, chunk):
+        """使用 `finalize` 得到的权重计算一块数据中各对象的得分。"""
+        return (np.asarray(chunk, dtype=np.float64) * self.W_j).sum(axis=1)
 
     def calculate_entropy(self):
         m, n = self.data.shape
-        K = 1 / np.log(m)
-        data_p = self.data / self.data.sum(axis=0)
-        self.e_j = -K * (data_p * np.log(data_p)).sum(axis=0)
+        self.e_j = _column_entropy(*_plogp_sums(np.asarray(self.data)), m)
         return self.e_j
 
     def calculate_weights(self):
@@ -64,64 +164,105 @@ class EntropyValueMethod:
             print("各对象的效率得分：", self.scores)
 
 
-def cal_weight(data: DataFrame or list, out_dict: bool = True):
+def _iter_chunks(data, chunksize: int = None) -> Iterable[np.ndarray]:
+    """按行分块返回数据，chunksize 为None时返回整个数组。"""
+    if chunksize is None:
+        yield data
+        return
+    for start in range(0, len(data), chunksize):
+        yield data[start : start + chunksize]
+
+
+def cal_weight(
+    data: DataFrame or list or np.ndarray or Callable,
+    out_dict: bool = True,
+    dtype=np.float64,
+    chunksize: int = None,
+):
     """
     使用熵权法计算指标的权重(Method 1)
 
+    先按列归一化，再按列累加 `Σy` 和 `Σy·ln(y)` 求熵值，全部为数组运算；
+    数据分块处理时，临时数组的大小只有一块。
+    空值(NaN)既不参与求最小值、最大值，也不参与累加。
+    取值都相同的指标(最大值等于最小值)没有区分度，熵值记为1，权重为0，不影响其他指标的权重。
+
     Args:
-        data (DataFrame or list): 类型为list或者pandas的DataFrame。
+        data (DataFrame or list or np.ndarray or Callable): 类型为list、np.ndarray或者pandas的DataFrame。
+            也可以是数据源函数：接收一个处理每页数据的函数并逐页调用它（例如对
+            `read_txt_by_page`、`aggregate_by_page` 的封装），每页为 DataFrame 或行的list，
+            数据源会被调用两遍（第一遍求每列的最小值、最大值，第二遍求熵值）。
         out_dict (bool): 若为True，则转化为键值对以dict类型返回；否则，以DataFrame类型返回。
+        dtype: 归一化后的数据类型，np.float64 或 np.float32，累加时始终使用 np.float64。
+        chunksize (int): 内存中的数据每次处理的行数，默认为None，一次处理全部数据。
 
     return:
         dict or DataFrame: 返回的权重值。
 
     """
+    # 列名，也就是每个参数的名称
+    columns = None
 
-    if isinstance(data, list):
-        data = pd.DataFrame(data)
+    def to_array(page):
+        nonlocal columns
+        if isinstance(page, DataFrame):
+            if columns is None:
+                columns = page.columns
+            return page.to_numpy(dtype=dtype)
+        return np.asarray(page, dtype=dtype)
 
-    # 去除空值
-    data.dropna()
+    if callable(data):
+        source = data
 
-    # 归一化
-    data = data.apply(
-        lambda data: ((data - np.min(data)) / (np.max(data) - np.min(data)))
-    )
-    # 列名，也就是每个参数的名称
-    columns = data.columns
+        def feed(scan: Callable[[np.ndarray], None]):
+            source(lambda page: scan(to_array(page)))
 
-    # 求k，即 -1/ln(n)
-    rows = data.index.size  # 行
-    cols = data.columns.size  # 列
-    k = 1.0 / math.log(rows)
+    else:
+        data = to_array(data)
+
+        def feed(scan: Callable[[np.ndarray], None]):
+            for chunk in _iter_chunks(data, chunksize):
+                scan(chunk)
+
+    # 第一遍：行数，每列的最小值、最大值，用于归一化
+    stats = {"rows": 0, "min": None, "max": None}
+
+    def scan_extremum(chunk: np.ndarray):
+        chunk_min, chunk_max = np.nanmin(chunk, axis=0), np.nanmax(chunk, axis=0)
+        if stats["min"] is None:
+            stats["min"], stats["max"] = chunk_min, chunk_max
+        else:
+            stats["min"] = np.fmin(stats["min"], chunk_min)
+            stats["max"] = np.fmax(stats["max"], chunk_max)
+        stats["rows"] += len(chunk)
+
+    feed(scan_extremum)
+    col_min = stats["min"]
+    col_range = stats["max"] - col_min
+    # 取值都相同的列归一化后全为0，避免 0/0
+    col_range = np.where(col_range == 0, 1, col_range)
+
+    # 第二遍：归一化后，累加 Σy 和 Σy·ln(y)
+    y_sum = np.zeros(len(col_min), dtype=np.float64)
+    ylogy_sum = np.zeros(len(col_min), dtype=np.float64)
+
+    def scan_entropy(chunk: np.ndarray):
+        y = ((chunk - col_min) / col_range).astype(dtype, copy=False)
+        chunk_y_sum, chunk_ylogy_sum = _plogp_sums(y)
+        y_sum[:] += chunk_y_sum
+        ylogy_sum[:] += chunk_ylogy_sum
+
+    feed(scan_entropy)
 
-    # 矩阵计算
     # 信息熵
-    data = np.array(data)
-    lnf = [[None] * cols for i in range(rows)]
-    lnf = np.array(lnf)
-    for i in range(0, rows):
-        for j in range(0, cols):
-            if data[i][j] == 0:
-                lnfij = 0.0
-            else:
-                p = data[i][j] / data.sum(axis=0)[j]
-                lnfij = math.log(p) * p * (-k)
-            lnf[i][j] = lnfij
-    lnf = pd.DataFrame(lnf)
-    E = lnf
+    E = _column_entropy(y_sum, ylogy_sum, stats["rows"])
 
     # 计算冗余度
-    d = 1 - E.sum(axis=0)
+    d = 1 - E
 
     # 计算各指标的权重
-    w = [[None] * 1 for i in range(cols)]
-    for j in range(0, cols):
-        wj = d[j] / sum(d)
-        w[j] = wj
-
-    w = pd.DataFrame(w)
-    w.index = columns
+    w = pd.DataFrame(d / d.sum())
+    w.index = columns if columns is not None else range(len(d))
     w.columns = ["weight"]
     result = w.transpose()
     if out_dict:
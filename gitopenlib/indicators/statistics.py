@@ -8,18 +8,21 @@
 # @Description :  一系列统计学相关的计算函数
 
 
-__version__ = "0.20.7"
+__version__ = "0.22.3"
 
 import math
 from collections import Counter
-from typing import List, Optional, Union
+from typing import Any, Callable, List, Optional, Union
 
 import numpy as np
 from gitopenlib.utils import basics as gb
+from pandas import DataFrame
 from scipy import stats
 
 
-def divide_bins(data: list, bins: int = 30, fmt: str = "count"):
+def divide_bins(
+    data: Union[list, np.ndarray], bins: int = 30, fmt: str = "count"
+):
     """
     把一个数据列表，分成多少个区间，并统计落在每个区间中的数值数目或百分比。
 
@@ -40,49 +43,51 @@ def divide_bins(data: list, bins: int = 30, fmt: str = "count"):
 
 
     Args:
-        data: 数据列表
+        data: 数据列表，也可以是 np.ndarray
         bins: 区间格式
         fmt: count表示统计区间数值的数目，percent表示统计区间数值数目的百分比
 
     Returns:
         返回值有两个，第一个是区间列表，第二个是统计结果列表
     """
+    if fmt not in ("count", "percent"):
+        raise Exception("fmt's value should be 'count' or 'percent'.")
+
+    values = np.asarray(data)
+
     # 划分为区间
-    bin_edges = divide_interval(data, bins)
-
-    # 在判断值属于某个区间的时候，采取与python区间相同的方法：前闭后开
-    res_dict = dict()
-
-    for it in data:
-        for idx, bin in enumerate(bin_edges):
-            if bin[0] not in res_dict:
-                res_dict[bin[0]] = 0
-            if idx == len(bin_edges) - 1:
-                if it >= bin[0] and it <= bin[1]:
-                    res_dict[bin[0]] += 1
-            else:
-                if it >= bin[0] and it < bin[1]:
-                    res_dict[bin[0]] += 1
+    bin_edges = divide_interval(values, bins)
+
+    # 在判断值属于某个区间的时候，采取与python区间相同的方法：前闭后开，
+    # 最后一个区间为闭区间
+    lefts = np.array([bin[0] for bin in bin_edges])
+    last_right = bin_edges[-1][1]
+    idx = np.searchsorted(lefts, values, side="right") - 1
+    valid = (idx >= 0) & (values <= last_right)
+    counts = np.bincount(idx[valid], minlength=len(lefts))
+
+    # 区间起点相同（例如数据都相等）时，合并为一个区间
+    starts, inverse = np.unique(lefts, return_inverse=True)
+    if len(starts) < len(lefts):
+        counts = np.bincount(inverse.ravel(), weights=counts).astype(np.int64)
 
-    res_dict = gb.dict_sorted(res_dict)
     if fmt == "count":
-        counts = list(res_dict.values())
-        return bin_edges, counts
-    elif fmt == "percent":
-        data_len = len(data)
-        percents = [round(it / data_len, 5) for it in res_dict.values()]
-        return bin_edges, percents
+        return bin_edges, counts.tolist()
     else:
-        raise Exception("fmt's value should be 'count' or 'percent'.")
+        data_len = len(values)
+        percents = [round(it / data_len, 5) for it in counts.tolist()]
+        return bin_edges, percents
 
 
 def divide_interval(
-    data: List[Union[int, float]], number: int, decimal: int = None
-) -> List[list]:
+    data: Union[List[Union[int, float]], np.ndarray],
+    number: int,
+    decimal: int = None,
+) -> List[tuple]:
     """把列表中数据，划分为区间
 
     Args:
-        data: 列表类型数据，元素为整型或者浮点型。
+        data: 列表类型数据，元素为整型或者浮点型，也可以是 np.ndarray。
         number: 划分的区间数目，整数类型。
         decimal: 区间端点的小数位数，默认不保留小数。
 
@@ -92,25 +97,15 @@ def divide_interval(
     """
     if number == 0:
         raise Exception("the number of interval can't be 0.")
-    max_, min_ = max(data), min(data)
+    max_, min_ = np.max(data).item(), np.min(data).item()
     poor = max_ - min_
     width = poor / number
 
-    result = []
-    interval = list()
-
-    for i in range(number + 1):
-        right = min_ + width * i
-        if decimal:
-            right = round(right, decimal)
-        interval.append(right)
-        if len(interval) == 2:
-            result.append(tuple(interval))
-            temp = tuple(interval)[-1]
-            interval.clear()
-            interval.append(temp)
+    edges = (min_ + width * np.arange(number + 1)).tolist()
+    if decimal:
+        edges = [round(edge, decimal) for edge in edges]
 
-    return result
+    return list(zip(edges[:-1], edges[1:]))
 
 
 def calculate_hist_bins2(data: list, k: float = 1.5) -> float:
@@ -121,69 +116,90 @@ def calculate_hist_bins2(data: list, k: float = 1.5) -> float:
     return bins
 
 
-def calculate_CDF(data: Union[list, dict]) -> dict:
-    """计算 Cumulative Distribution Function (CDF)
+def _value_counts(data: Union[list, dict, np.ndarray]) -> tuple:
+    """统计数值及其出现的次数，按数值从小到大排列。
 
     Args:
-        data: 数据。
+        data: 数据列表（或 np.ndarray），或者 Counter 形式的 dict。
 
     Returns:
-        每个key对应计算的累计频率。
-
+        tuple: (数值, 次数)，均为 np.ndarray。
     """
+    if isinstance(data, dict):
+        data = gb.dict_sorted(data)
+        keys = np.array(list(data.keys()))
+        counts = np.array(list(data.values()))
+    else:
+        keys, counts = np.unique(np.asarray(data), return_counts=True)
+    return keys, counts
 
-    if isinstance(data, list):
-        data = dict(Counter(data))
 
-    data = gb.dict_sorted(data)
+def calculate_CDF(
+    data: Union[list, dict, np.ndarray], as_dict: bool = True
+) -> Union[dict, tuple]:
+    """计算 Cumulative Distribution Function (CDF)
 
-    keys = list(data.keys())
-    values = list(data.values())
-    sum_ = sum(values)
+    Args:
+        data: 数据，可以是列表、np.ndarray 或者 Counter 形式的 dict。
+        as_dict: 默认为 True，返回 dict；False 返回 (数值, 累计频率) 两个数组。
 
-    new_values = list()
-    for index, item in enumerate(data):
-        new_values.append(sum(values[: index + 1]) / sum_)
+    Returns:
+        每个key对应计算的累计频率。
 
-    return dict(zip(keys, new_values))
+    """
+    keys, counts = _value_counts(data)
+    cumsum = np.cumsum(counts)
+    if len(cumsum) == 0:
+        # 空数据没有累计频率
+        cdf = cumsum.astype(np.float64)
+    else:
+        cdf = cumsum / cumsum[-1]
+
+    if as_dict:
+        return dict(zip(keys.tolist(), cdf.tolist()))
+    return keys, cdf
 
 
-def calculate_CCDF(data: Union[list, dict]) -> dict:
+def calculate_CCDF(
+    data: Union[list, dict, np.ndarray], as_dict: bool = True
+) -> Union[dict, tuple]:
     """计算 Complementary Cumulative Distribution Function (CCDF)
 
     Args:
-        data: 数据。
+        data: 数据，可以是列表、np.ndarray 或者 Counter 形式的 dict。
+        as_dict: 默认为 True，返回 dict；False 返回 (数值, 互补累计频率) 两个数组。
 
     Returns:
         每个key对应计算的互补累计频率。
 
     """
-    return {k: 1 - v for k, v in calculate_CDF(data).items()}
+    keys, cdf = calculate_CDF(data, as_dict=False)
+    ccdf = 1 - cdf
+
+    if as_dict:
+        return dict(zip(keys.tolist(), ccdf.tolist()))
+    return keys, ccdf
 
 
-def calculate_PMF(data: Union[list, dict]) -> dict:
+def calculate_PMF(
+    data: Union[list, dict, np.ndarray], as_dict: bool = True
+) -> Union[dict, tuple]:
     """计算 Probability Mass Function (PMF)
 
     Args:
-        data: 数据。
+        data: 数据，可以是列表、np.ndarray 或者 Counter 形式的 dict。
+        as_dict: 默认为 True，返回 dict；False 返回 (数值, 频率) 两个数组。
 
     Returns:
         每个key对应计算的单个频率。
 
     """
+    keys, counts = _value_counts(data)
+    pmf = counts / counts.sum()
 
-    if isinstance(data, list):
-        data = dict(Counter(data))
-
-    data = gb.dict_sorted(data)
-
-    keys = list(data.keys())
-    values = list(data.values())
-    sum_ = sum(values)
-
-    new_values = [it / sum_ for it in values]
-
-    return dict(zip(keys, new_values))
+    if as_dict:
+        return dict(zip(keys.tolist(), pmf.tolist()))
+    return keys, pmf
 
 
 def calculate_percent(data: dict, mode: str = "gte") -> None:
@@ -293,11 +309,78 @@ def normal_distribution_values(
     return x, y
 
 
+class RankIndex:
+    """百分等级、百分位数的查询索引。
+
+    只在创建时对样本排序一次，之后的查询都用二分查找完成，
+    支持单个数值查询，也支持传入数组批量查询（返回数组）。
+
+    example:
+        ```python
+        ri = RankIndex(field_scores)
+        ri.percentile_rank(author_score)
+        ri.percentile_rank(np.array(author_scores))
+        ri.percentile(90)
+        ```
+
+    Args:
+        scores (list or np.ndarray): 样本集（分数列表）
+    """
+
+    def __init__(self, scores: Union[list, np.ndarray]):
+        self.sorted_scores = np.sort(np.asarray(scores), kind="stable")
+        self.n = len(self.sorted_scores)
+        self._ranks = None
+
+    @staticmethod
+    def _output(result: np.ndarray):
+        return result.item() if result.ndim == 0 else result
+
+    def cdf(self, x):
+        """小于等于x的值的比例，见 `Cdf`。"""
+        count = np.searchsorted(self.sorted_scores, x, side="right")
+        return self._output(np.asarray(count / self.n))
+
+    def percentile_rank(self, your_score):
+        """获取百分等级，见 `percentile_rank`。"""
+        count = np.searchsorted(self.sorted_scores, your_score, side="right")
+        return self._output(np.asarray(100.0 * count / self.n))
+
+    def percentile(self, prank):
+        """根据百分等级，找到百分位数，见 `percentile`。
+
+        Args:
+            prank (int or float or np.ndarray): 百分等级
+
+        Returns:
+            百分等级大于等于prank的最小分数；prank大于100时，
+            单个查询返回None，批量查询返回nan。
+        """
+        if self._ranks is None:
+            # 每个样本的百分等级，单调不减
+            self._ranks = (
+                100.0
+                * np.searchsorted(
+                    self.sorted_scores, self.sorted_scores, side="right"
+                )
+                / self.n
+            )
+        prank = np.asarray(prank)
+        pos = np.searchsorted(self._ranks, prank, side="left")
+        found = pos < self.n
+        if prank.ndim == 0:
+            return self.sorted_scores[pos].item() if found else None
+        result = np.full(prank.shape, np.nan)
+        result[found] = self.sorted_scores[pos[found]]
+        return result
+
+
 def Cdf(t, x) -> float:
     """累计分布函数，就是值到其在分布中百分等级的映射。
 
     计算给定x的CDF(x)，就是计算样本中小于等于x的值的比例。
     在画图时，样本的CDF是一个阶跃函数（图形形状类似向上的阶梯）。
+    需要多次查询同一个样本集时，请使用 `RankIndex`。
 
     Args:
         t (list): 样本集
@@ -307,10 +390,7 @@ def Cdf(t, x) -> float:
         (float): 概率，小于等于x的值的概率
 
     """
-    count = 0.0
-    for value in t:
-        if value <= x:
-            count += 1.0
+    count = np.count_nonzero(np.asarray(t) <= x)
     prob = count / len(t)
     return prob
 
@@ -322,6 +402,7 @@ def percentile_rank(
 
     百分等级就是原始分数不 高于你的人在全部考试人数中所占的比例再乘以100。
     如果你 在 90 百分位数，那就是说你比 90% 的人成绩好，或者至少不比 90% 的考试人员差。
+    需要多次查询同一个分数列表时，请使用 `RankIndex`。
 
     Args:
         scores (list): 分数列表
@@ -330,10 +411,7 @@ def percentile_rank(
     Returns:
         (int or float): 百分位数
     """
-    count = 0
-    for score in scores:
-        if score <= your_score:
-            count += 1
+    count = np.count_nonzero(np.asarray(scores) <= your_score)
     percentile_rank = 100.0 * count / len(scores)
     return percentile_rank
 
@@ -349,10 +427,8 @@ def percentile(scores, prank) -> Union[int, float]:
         (int or float): 百分位数
 
     """
-    scores.sort()
-    for score in scores:
-        if percentile_rank(scores, score) >= prank:
-            return score
+    # RankIndex 对副本排序，不修改传入的 scores
+    return RankIndex(scores).percentile(prank)
 
 
 def percentile2(scores, prank) -> Union[int, float]:
@@ -366,8 +442,8 @@ def percentile2(scores, prank) -> Union[int, float]:
         (int or float): 百分位数
 
     """
-    scores.sort()
-    index = percentile_rank * (len(scores) - 1) / 100
+    scores = np.sort(np.asarray(scores))
+    index = int(prank * (len(scores) - 1) / 100)
     return scores[index]
 
 
@@ -456,6 +532,244 @@ def kurtosis_skewness(data: list):
     return k_, s_
 
 
+class QuantileSketch:
+    """KLL 风格的分位数草图，用有限的内存近似计算分位数。
+
+    数据分层保存，第h层的每个元素代表 2^h 个原始数据；某一层超过容量时，
+    排序后随机保留奇数位或偶数位的元素，放入上一层。
+    保存的元素数目约为 O(k)，分位数的排名误差约为 1.7/k。
+    多个草图（例如不同进程中构建的）可以通过 `merge` 合并。
+
+    Args:
+        k (int): 精度参数，越大越精确，占用的内存也越多
+        seed (int): 随机数种子，默认为None
+    """
+
+    def __init__(self, k: int = 200, seed: int = None):
+        self.k = k
+        self.n = 0
+        self._levels = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_error(cls, error: float = 0.01, seed: int = None):
+        """按照允许的排名误差创建草图，例如 error=0.01 表示排名误差约为1%。"""
+        return cls(k=int(math.ceil(1.7 / error)), seed=seed)
+
+    def _capacity(self, h: int) -> int:
+        """第h层的容量，越低的层容量越小。"""
+        depth = len(self._levels) - h - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self._levels):
+            level = self._levels[h]
+            if len(level) >= self._capacity(h):
+                if h + 1 == len(self._levels):
+                    self._levels.append(np.empty(0, dtype=np.float64))
+                level = np.sort(level)
+                # 元素数目为奇数时，留下一个元素在当前层
+                odd = len(level) % 2
+                offset = self._rng.integers(2)
+                self._levels[h + 1] = np.concatenate(
+                    [self._levels[h + 1], level[odd:][offset::2]]
+                )
+                self._levels[h] = level[:odd]
+            h += 1
+
+    def update(self, values: Union[list, np.ndarray]):
+        """累加一批数值。
+
+        Returns:
+            QuantileSketch: self
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.n += len(values)
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        """合并另一个草图。
+
+        Returns:
+            QuantileSketch: self
+        """
+        for h, level in enumerate(other._levels):
+            if h == len(self._levels):
+                self._levels.append(np.empty(0, dtype=np.float64))
+            self._levels[h] = np.concatenate([self._levels[h], level])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q: Union[float, list, np.ndarray]):
+        """近似的分位数。
+
+        Args:
+            q (float or list or np.ndarray): 分位点，取值范围为[0, 1]
+
+        Returns:
+            float or np.ndarray: 分位数
+        """
+        values = np.concatenate(self._levels)
+        weights = np.concatenate(
+            [
+                np.full(len(level), 2.0**h)
+                for h, level in enumerate(self._levels)
+            ]
+        )
+        order = np.argsort(values, kind="stable")
+        values = values[order]
+        cum_weights = np.cumsum(weights[order])
+
+        q = np.asarray(q, dtype=np.float64)
+        pos = np.searchsorted(cum_weights, q * cum_weights[-1], side="left")
+        result = values[np.clip(pos, 0, len(values) - 1)]
+        return result.item() if result.ndim == 0 else result
+
+    def percentile(self, p: Union[float, list, np.ndarray]):
+        """近似的百分位数，p 的取值范围为[0, 100]，见 `np.percentile`。"""
+        return self.quantile(np.asarray(p, dtype=np.float64) / 100)
+
+
+class StatsAccumulator:
+    """描述性统计量的流式累加器。
+
+    一次遍历数据，累加数目、均值、二阶到四阶中心矩（Welford/Pébay 算法）、
+    最小值和最大值，并用 `QuantileSketch` 近似计算分位数；
+    可以直接作为 `read_txt_by_page`、`aggregate_by_page` 的 parse_func，
+    在不同进程中构建的累加器可以通过 `merge` 合并。
+
+    example:
+        ```python
+        acc = StatsAccumulator(parser=float)
+        gf.read_txt_by_page("citations.txt", acc.update, page_size=100000)
+        acc.mean, acc.coefficient_of_variation(), acc.kurtosis_skewness()
+        acc.calculate_IQR(k=1.5)
+        ```
+
+    Args:
+        parser (Callable): 默认为None，表示每条记录已经是数值；
+            否则用来把每条记录（如文本行、mongo文档）转换为数值。
+        sketch_k (int): 分位数草图的精度参数，见 `QuantileSketch`
+    """
+
+    def __init__(
+        self, parser: Callable[[Any], float] = None, sketch_k: int = 200
+    ):
+        self.parser = parser
+        self.count = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.M3 = 0.0
+        self.M4 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(k=sketch_k)
+
+    def _combine(self, n_b, mean_b, M2_b, M3_b, M4_b):
+        """按照 Pébay 的公式合并两组数据的中心矩。"""
+        n_a = self.count
+        n = n_a + n_b
+        if n_b == 0:
+            return
+        delta = mean_b - self.mean
+        M2_a, M3_a = self.M2, self.M3
+
+        self.M4 = (
+            self.M4
+            + M4_b
+            + delta**4 * n_a * n_b * (n_a**2 - n_a * n_b + n_b**2) / n**3
+            + 6 * delta**2 * (n_a**2 * M2_b + n_b**2 * M2_a) / n**2
+            + 4 * delta * (n_a * M3_b - n_b * M3_a) / n
+        )
+        self.M3 = (
+            M3_a
+            + M3_b
+            + delta**3 * n_a * n_b * (n_a - n_b) / n**2
+            + 3 * delta * (n_a * M2_b - n_b * M2_a) / n
+        )
+        self.M2 = M2_a + M2_b + delta**2 * n_a * n_b / n
+        self.mean = self.mean + delta * n_b / n
+        self.count = n
+
+    def update(self, batch: Union[list, np.ndarray]):
+        """累加一批数据。
+
+        Returns:
+            StatsAccumulator: self
+        """
+        if self.parser is not None:
+            batch = [self.parser(record) for record in batch]
+        values = np.asarray(batch, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return self
+
+        mean_b = values.mean()
+        diff = values - mean_b
+        diff2 = diff**2
+        self._combine(
+            len(values),
+            mean_b,
+            diff2.sum(),
+            (diff2 * diff).sum(),
+            (diff2**2).sum(),
+        )
+        self.min = min(self.min, values.min().item())
+        self.max = max(self.max, values.max().item())
+        self.sketch.update(values)
+        return self
+
+    def merge(self, other: "StatsAccumulator"):
+        """合并另一个累加器。
+
+        Returns:
+            StatsAccumulator: self
+        """
+        self._combine(other.count, other.mean, other.M2, other.M3, other.M4)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def variance(self, ddof: int = 0) -> float:
+        """方差，ddof 的含义同 `np.var`。"""
+        return self.M2 / (self.count - ddof)
+
+    def std(self, ddof: int = 0) -> float:
+        """标准差，ddof 的含义同 `np.std`。"""
+        return math.sqrt(self.variance(ddof))
+
+    def coefficient_of_variation(self) -> float:
+        """变异系数，见 `coefficient_of_variation`。"""
+        return self.std() / self.mean
+
+    def kurtosis_skewness(self) -> tuple:
+        """峰度和偏度，与 `kurtosis_skewness`（scipy.stats 的默认参数）一致。"""
+        k_ = self.count * self.M4 / self.M2**2 - 3
+        s_ = math.sqrt(self.count) * self.M3 / self.M2**1.5
+        return k_, s_
+
+    def percentile(self, p: Union[float, list, np.ndarray]):
+        """近似的百分位数，p 的取值范围为[0, 100]。"""
+        return self.sketch.percentile(p)
+
+    def calculate_IQR(self, k: float = 1.5) -> tuple:
+        """近似的四分位距，返回值的顺序同 `calculate_IQR`。"""
+        lower_quartile, median, upper_quartile = self.percentile([25, 50, 75])
+        IQR = upper_quartile - lower_quartile
+        return (
+            upper_quartile + IQR * k,
+            upper_quartile,
+            median,
+            lower_quartile,
+            lower_quartile - IQR * k,
+            IQR,
+        )
+
+
 def KL_divergence(p: list, q: list):
     """计算KL散度，两者越相似，KL散度越小。
 
@@ -521,17 +835,25 @@ def counter2percenter(data: dict) -> dict:
     return dict([(key, value / sum_) for key, value in data.items()])
 
 
-def calculate_IQR(data: list, k: float = 1.5) -> tuple:
+def calculate_IQR(
+    data: Union[list, np.ndarray], k: float = 1.5, error: float = None
+) -> tuple:
     """计算四分位距（IQR, Interquartile range）
 
     Args:
         data (list): list类型的数据，每个元素为 int 或 float 类型。
         k (float): 表示异常系数，k = 1.5表示中度异常，k = 3表示极度异常。
+        error (float): 默认为None，用 np.percentile 精确计算；
+            指定时用 `QuantileSketch` 近似计算，error 为允许的排名误差，如0.01。
 
     Returns:
         tuple: 顺序为：upper whisker, upper quartile, median, lower quartile, lower whisker, IQR
     """
-    Percentile = np.percentile(data, [0, 25, 50, 75, 100])
+    if error is None:
+        Percentile = np.percentile(data, [0, 25, 50, 75, 100])
+    else:
+        sketch = QuantileSketch.from_error(error).update(data)
+        Percentile = sketch.percentile([0, 25, 50, 75, 100])
     upper_quartile = Percentile[3]
     lower_quartile = Percentile[1]
     IQR = upper_quartile - lower_quartile
@@ -549,13 +871,25 @@ def calculate_IQR(data: list, k: float = 1.5) -> tuple:
     )
 
 
-def filter_outliers_by_IQR(data: list, k: float = 1.5) -> tuple:
+def _as_output(values: np.ndarray, data: Union[list, np.ndarray]):
+    """输入为 list 时返回 list，否则返回 np.ndarray。"""
+    return values.tolist() if isinstance(data, list) else values
+
+
+def filter_outliers_by_IQR(
+    data: Union[list, np.ndarray],
+    k: float = 1.5,
+    error: float = None,
+    verbose: bool = True,
+) -> tuple:
     """
     使用IQR对异常值进行检测，又称为 Tukey's test。
 
     Args:
         data (list): list类型的数据，每个元素为 int 或 float 类型。
         k (float): 表示异常系数，k = 1.5表示中度异常，k = 3表示极度异常。
+        error (float): 默认为None，精确计算分位数；指定时近似计算，见 `calculate_IQR`。
+        verbose (bool): 是否打印上下须的值，默认为True。
 
     Returns:
         tuple: upper outliers, lower outliers
@@ -568,22 +902,27 @@ def filter_outliers_by_IQR(data: list, k: float = 1.5) -> tuple:
         lower_quartile,
         lower_whisker,
         IQR,
-    ) = calculate_IQR(data, k=k)
-    print(" upper_whisker : ", upper_whisker)
-    print(" lower_whisker : ", lower_whisker)
-    upper_outliers = [item for item in data if item > upper_whisker]
-    lower_outliers = [item for item in data if item < lower_whisker]
+    ) = calculate_IQR(data, k=k, error=error)
+    if verbose:
+        print(" upper_whisker : ", upper_whisker)
+        print(" lower_whisker : ", lower_whisker)
+    values = np.asarray(data)
+    upper_outliers = _as_output(values[values > upper_whisker], data)
+    lower_outliers = _as_output(values[values < lower_whisker], data)
 
     return upper_outliers, lower_outliers
 
 
-def remove_outliers_by_IQR(data: list, k: float = 1.5) -> list:
+def remove_outliers_by_IQR(
+    data: Union[list, np.ndarray], k: float = 1.5, error: float = None
+) -> list:
     """
     使用IQR从数据中移除异常值，返回移除异常值的数据
 
     Args:
         data (list): list类型的数据，每个元素为 int 或 float 类型。
         k (float): 表示异常系数，k = 1.5表示中度异常，k = 3表示极度异常。
+        error (float): 默认为None，精确计算分位数；指定时近似计算，见 `calculate_IQR`。
 
     Returns:
         list: 移除异常值后的数据
@@ -595,14 +934,85 @@ def remove_outliers_by_IQR(data: list, k: float = 1.5) -> list:
         lower_quartile,
         lower_whisker,
         IQR,
-    ) = calculate_IQR(data, k=k)
+    ) = calculate_IQR(data, k=k, error=error)
+
+    values = np.asarray(data)
+    mask = (values <= upper_whisker) & (values >= lower_whisker)
+    return _as_output(values[mask], data)
+
+
+def remove_outliers_by_IQR_streaming(
+    source: Callable[[Callable[[list], None]], None],
+    kept_sink: Callable[[list], None],
+    rejected_sink: Callable[[list], None] = None,
+    key: Callable[[Any], float] = None,
+    k: float = 1.5,
+    error: float = 0.01,
+) -> tuple:
+    """
+    两遍扫描，流式地使用IQR移除异常值，适用于无法一次性放入内存的数据。
+
+    第一遍用 `QuantileSketch` 近似计算上下须，内存占用只与 error 有关；
+    第二遍把每一页数据分为保留的和异常的两部分，分别交给 kept_sink 和 rejected_sink。
+
+    example:
+        ```python
+        def source(parse_func):
+            gf.read_txt_by_page("metrics.jsonl", parse_func, page_size=100000)
+
+        kept = open("kept.jsonl", "w")
+        rejected = open("rejected.jsonl", "w")
+        remove_outliers_by_IQR_streaming(
+            source,
+            lambda lines: kept.writelines(line + "\n" for line in lines),
+            lambda lines: rejected.writelines(line + "\n" for line in lines),
+            key=lambda line: json.loads(line)["citations"],
+        )
+        ```
+
+    Args:
+        source (Callable): 数据源，接收一个处理每页数据的函数并逐页调用它，
+            需要可以重复调用（扫描两遍），例如对 `read_txt_by_page` 的封装。
+        kept_sink (Callable): 接收每一页中保留的记录。
+        rejected_sink (Callable): 接收每一页中的异常记录，默认为None，丢弃。
+        key (Callable): 从记录中取出用于判断的数值，默认为None，记录本身就是数值。
+        k (float): 表示异常系数，k = 1.5表示中度异常，k = 3表示极度异常。
+        error (float): 分位数允许的排名误差，见 `QuantileSketch.from_error`。
+
+    Returns:
+        tuple: upper whisker, lower whisker, 保留的记录数, 异常的记录数
+    """
+
+    def values_of(page: list) -> np.ndarray:
+        if key is not None:
+            page = [key(record) for record in page]
+        return np.asarray(page, dtype=np.float64)
 
-    new_data = [
-        item
-        for item in data
-        if item <= upper_whisker and item >= lower_whisker
-    ]
-    return new_data
+    # 第一遍：近似计算分位数
+    sketch = QuantileSketch.from_error(error)
+    source(lambda page: sketch.update(values_of(page)))
+    lower_quartile, upper_quartile = sketch.percentile([25, 75])
+    IQR = upper_quartile - lower_quartile
+    upper_whisker = upper_quartile + IQR * k
+    lower_whisker = lower_quartile - IQR * k
+
+    # 第二遍：分流
+    counts = [0, 0]
+
+    def route(page: list):
+        values = values_of(page)
+        mask = (values <= upper_whisker) & (values >= lower_whisker)
+        kept = [record for record, keep in zip(page, mask) if keep]
+        rejected = [record for record, keep in zip(page, mask) if not keep]
+        counts[0] += len(kept)
+        counts[1] += len(rejected)
+        kept_sink(kept)
+        if rejected_sink is not None:
+            rejected_sink(rejected)
+
+    source(route)
+
+    return upper_whisker, lower_whisker, counts[0], counts[1]
 
 
 def calculate_list_count_percent(
@@ -681,56 +1091,171 @@ def smooth_matlab(data: Optional[list or np.array], window_size: int = 3):
     return np.concatenate((start, out0, stop))
 
 
+def _scale(
+    data,
+    decimals: Optional[int],
+    axis: Optional[int],
+    groups,
+    out: Optional[np.ndarray],
+    dtype,
+    center: str,
+    scale: Optional[str],
+):
+    """归一化、标准化、零均值化的公共实现。
+
+    在 out（默认为输入数据的副本）上原地计算；按列处理，
+    分组统计量用 np.bincount / ufunc.at 计算，临时数组的大小只有一列。
+
+    Args:
+        center: "min" 表示减去最小值，"mean" 表示减去均值。
+        scale: "range" 表示除以极差，"std" 表示除以标准差，None 表示不缩放。
+    """
+    is_df = isinstance(data, DataFrame)
+    values = data.to_numpy() if is_df else np.asarray(data)
+    if dtype is None:
+        dtype = (
+            values.dtype
+            if values.dtype in (np.float32, np.float64)
+            else np.float64
+        )
+    if out is None:
+        out = values.astype(dtype, copy=True)
+    elif out is not values:
+        out[...] = values
+
+    if groups is not None and axis is None:
+        raise Exception("groups can only be used with axis=0.")
+
+    if axis is None:
+        columns = [out]
+    elif axis == 0:
+        columns = (
+            [out]
+            if out.ndim == 1
+            else [out[:, j] for j in range(out.shape[1])]
+        )
+    else:
+        raise Exception("axis's value should be None or 0.")
+
+    codes = None
+    if groups is not None:
+        codes = np.unique(np.asarray(groups), return_inverse=True)[1].ravel()
+        n_groups = codes.max() + 1
+        counts = np.bincount(codes, minlength=n_groups)
+
+    for col in columns:
+        if codes is None:
+            if center == "min":
+                c = col.min()
+                r = col.max() - c
+            else:
+                c = col.mean(dtype=np.float64)
+                r = col.std(dtype=np.float64)
+            col -= c
+            if scale is not None:
+                col /= r
+        else:
+            if center == "min":
+                c = np.full(n_groups, np.inf)
+                r = np.full(n_groups, -np.inf)
+                np.minimum.at(c, codes, col)
+                np.maximum.at(r, codes, col)
+                r -= c
+            else:
+                c = (
+                    np.bincount(codes, weights=col, minlength=n_groups)
+                    / counts
+                )
+            col -= c[codes]
+            if scale == "std":
+                r = np.sqrt(
+                    np.bincount(codes, weights=col * col, minlength=n_groups)
+                    / counts
+                )
+            if scale is not None:
+                col /= r[codes]
+
+    if decimals is not None:
+        np.around(out, decimals=decimals, out=out)
+
+    if is_df:
+        return DataFrame(out, index=data.index, columns=data.columns)
+    return out
+
+
 def normalization(
-    data: Optional[list or np.array], decimals: None or int = None
+    data: Optional[list or np.array or DataFrame],
+    decimals: None or int = None,
+    axis: Optional[int] = None,
+    groups: Optional[list or np.array] = None,
+    out: Optional[np.ndarray] = None,
+    dtype=None,
 ):
     """
     对一系列数据进行归一化处理，对原始数据进行线性变换把数据映射到[0,1]之间。
 
     Args:
-        data (list or np.array): 需要被归一化的数据。
+        data (list or np.array or DataFrame): 需要被归一化的数据。
         decimals (None or int): 归一化后，数值保留的精度（小数位数），默认为None，不开启
+        axis (None or int): 默认为None，使用全部数据的最大值、最小值；0表示按列归一化。
+        groups (list or np.array): 默认为None；每一行所属的分组id，按组、按列归一化，需要 axis=0。
+        out (np.ndarray): 默认为None，返回新数组；指定时结果写入 out，
+            传入 data 本身（浮点型 np.ndarray）即为原地计算。
+        dtype: 结果的数据类型，例如 np.float32，默认为 np.float64（输入为浮点型时与输入一致）。
 
     Returns:
-        np.array: 处理后的数据
+        np.array: 处理后的数据，输入为 DataFrame 时返回 DataFrame
     """
-    _range = np.max(data) - np.min(data)
-    ret = (data - np.min(data)) / _range
-    return ret if decimals is None else np.around(ret, decimals=decimals)
+    return _scale(data, decimals, axis, groups, out, dtype, "min", "range")
 
 
 def standardization(
-    data: Optional[list or np.array], decimals: None or int = None
+    data: Optional[list or np.array or DataFrame],
+    decimals: None or int = None,
+    axis: Optional[int] = 0,
+    groups: Optional[list or np.array] = None,
+    out: Optional[np.ndarray] = None,
+    dtype=None,
 ):
     """
     对一系列数据进行标准化处理，常用的方法是z-score标准化，处理后数据均值为0，标准差为1。
 
     Args:
-        data (list or np.array): 需要被标准化的数据。
+        data (list or np.array or DataFrame): 需要被标准化的数据。
         decimals (None or int): 归一化后，数值保留的精度（小数位数），默认为None，不开启
+        axis (None or int): 默认为0，按列标准化；None 表示使用全部数据的均值、标准差。
+        groups (list or np.array): 默认为None；每一行所属的分组id，按组、按列标准化。
+        out (np.ndarray): 默认为None，返回新数组；指定时结果写入 out，
+            传入 data 本身（浮点型 np.ndarray）即为原地计算。
+        dtype: 结果的数据类型，例如 np.float32，默认为 np.float64（输入为浮点型时与输入一致）。
 
     Returns:
-        np.array: 处理后的数据
+        np.array: 处理后的数据，输入为 DataFrame 时返回 DataFrame
     """
-    mu = np.mean(data, axis=0)
-    sigma = np.std(data, axis=0)
-    ret = (data - mu) / sigma
-    return ret if decimals is None else np.around(ret, decimals=decimals)
+    return _scale(data, decimals, axis, groups, out, dtype, "mean", "std")
 
 
 def zero_centered(
-    data: Optional[list or np.array], decimals: None or int = None
+    data: Optional[list or np.array or DataFrame],
+    decimals: None or int = None,
+    axis: Optional[int] = 0,
+    groups: Optional[list or np.array] = None,
+    out: Optional[np.ndarray] = None,
+    dtype=None,
 ):
     """
     对一系列数据进行零均值化，即zero-centered。对数据的平移的一个过程，之后数据的中心点为(0,0)。
 
     Args:
-        data (list or np.array): 需要被零均值化的数据。
+        data (list or np.array or DataFrame): 需要被零均值化的数据。
         decimals (None or int): 数值保留的精度（小数位数），默认为None，不开启
+        axis (None or int): 默认为0，按列零均值化；None 表示使用全部数据的均值。
+        groups (list or np.array): 默认为None；每一行所属的分组id，按组、按列零均值化。
+        out (np.ndarray): 默认为None，返回新数组；指定时结果写入 out，
+            传入 data 本身（浮点型 np.ndarray）即为原地计算。
+        dtype: 结果的数据类型，例如 np.float32，默认为 np.float64（输入为浮点型时与输入一致）。
 
     Returns:
-        np.array: 处理后的数据
+        np.array: 处理后的数据，输入为 DataFrame 时返回 DataFrame
     """
-    mu = np.mean(data, axis=0)
-    ret = data - mu
-    return ret if decimals is None else np.around(ret, decimals=decimals)
+    return _scale(data, decimals, axis, groups, out, dtype, "mean", None)
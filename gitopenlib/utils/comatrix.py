@@ -8,20 +8,422 @@
 # @Description :  求解共现矩阵
 
 
-__version__ = "0.2.1"
+__version__ = "0.3.4"
 
 import csv
-import math
-from collections import defaultdict
-from itertools import product
-
+import json
+import os
+from collections import Counter
+from itertools import chain
+from multiprocessing import Pool
+from typing import Any, Callable, Iterable, List, Tuple
+
+import numpy as np
+from scipy import sparse
 from sklearn.metrics.pairwise import cosine_distances, cosine_similarity
+from sklearn.preprocessing import normalize
 
 from gitopenlib.utils import basics as gb
 from gitopenlib.utils import files as gf
 from gitopenlib.utils import wonders
 
 
+def _select_tags(kw_num_dict: dict, filter_num: int = 1, filter_tags: list = None):
+    """依据频次和指定的tag列表过滤，返回排序后的tag列表。"""
+    kws = [kw for kw, num in kw_num_dict.items() if num >= filter_num]
+    # 如果同时指定了 filter_num 和 filter_kws ，
+    # 那么需要对两种情况下的关键词列表取交集
+    if filter_tags:
+        kws = set(kws).intersection(set(filter_tags))
+    return sorted(kws)
+
+
+def _incidence_matrix(data: list, kw_index: dict):
+    """
+    构建 文档×tag 的 CSR 关联矩阵，元素为tag在该文档中出现的次数，
+    不在 kw_index（tag到列号的映射）中的tag会被忽略。
+    """
+    indices = list()
+    indptr = [0]
+    for item in data:
+        indices.extend(kw_index[kw] for kw in item if kw in kw_index)
+        indptr.append(len(indices))
+    X = sparse.csr_matrix(
+        (
+            np.ones(len(indices), dtype=np.int64),
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(indptr, dtype=np.int64),
+        ),
+        shape=(len(indptr) - 1, len(kw_index)),
+    )
+    X.sum_duplicates()
+    return X
+
+
+def _cooccurrence_matrix(X):
+    """
+    由关联矩阵求共现矩阵 X.T @ X，对角线（tag与自身的共现）置为0。
+
+    元素为两两组合在各文档中出现次数乘积之和，与 product(item, item) 的计数方式一致。
+    """
+    C = (X.T @ X).tocsr()
+    C = (C - sparse.diags(C.diagonal(), dtype=C.dtype)).tocsr()
+    C.eliminate_zeros()
+    return C
+
+
+# 子进程中 tag到列号 的映射，由 _init_worker 设置，每个子进程各有一份副本
+_worker_kw_index = None
+
+
+def _init_worker(kw_index: dict):
+    """进程池的初始化函数，词表映射在每个子进程启动时复制一次，而不是随每块数据传递。"""
+    global _worker_kw_index
+    _worker_kw_index = kw_index
+
+
+def _count_tags(chunk: list) -> Counter:
+    """子进程中统计一块数据的tag频次。"""
+    return Counter(chain.from_iterable(chunk))
+
+
+def _count_chunk(chunk: list):
+    """子进程中计算一块数据的共现矩阵和tag频次。"""
+    X = _incidence_matrix(chunk, _worker_kw_index)
+    return _cooccurrence_matrix(X), np.asarray(X.sum(axis=0), dtype=np.int64).ravel()
+
+
+def _count_parallel(data: list, filter_num: int, filter_tags: list, process_num: int):
+    """
+    使用进程池分块计算：第一遍各进程统计tag频次，在主进程中合并后筛选tag；
+    第二遍各进程计算稀疏的部分共现矩阵，在主进程中求和。
+
+    Returns:
+        tuple: (tag列表, 共现矩阵, tag频次)
+    """
+    # 分块数目多于进程数，使各进程的负载更均衡
+    chunks = gb.chunks(data, process_num * 4) if len(data) > 0 else []
+
+    kw_num_dict = Counter()
+    with Pool(process_num) as pool:
+        for counter in pool.imap_unordered(_count_tags, chunks):
+            kw_num_dict.update(counter)
+    kws = _select_tags(kw_num_dict, filter_num, filter_tags)
+    kw_index = {kw: idx for idx, kw in enumerate(kws)}
+
+    n = len(kw_index)
+    frequency_vector = sparse.csr_matrix((n, n), dtype=np.int64)
+    frequencies = np.zeros(n, dtype=np.int64)
+    with Pool(process_num, initializer=_init_worker, initargs=(kw_index,)) as pool:
+        for pairs, freqs in pool.imap_unordered(_count_chunk, chunks):
+            frequency_vector = frequency_vector + pairs
+            frequencies += freqs
+    return kws, frequency_vector.tocsr(), frequencies.astype(np.float64)
+
+
+def _ochiia_matrix(C, frequencies: np.ndarray):
+    """
+    Ochiia系数将共词矩阵转换为相关矩阵，
+    ochiia = kw1_kw2共现次数 / ( kw1频次平方根*kw2频次平方根 )
+    """
+    inv_sqrt = np.zeros(len(frequencies), dtype=np.float64)
+    nonzero = frequencies > 0
+    inv_sqrt[nonzero] = 1 / np.sqrt(frequencies[nonzero])
+    D = sparse.diags(inv_sqrt)
+    return (D @ C @ D).tocsr()
+
+
+def _cosine_matrices(C):
+    """
+    稀疏地计算共现矩阵行向量之间的余弦相似度和余弦距离。
+
+    余弦距离只在相似度非零的位置（以及对角线）上存储 `1 - 相似度`，
+    未存储的位置表示距离为 1。
+    """
+    N = normalize(C.astype(np.float64), norm="l2", axis=1)
+    S = (N @ N.T).tocsr()
+
+    S_coo = S.tocoo()
+    off_diag = S_coo.row != S_coo.col
+    n = C.shape[0]
+    row = np.concatenate([S_coo.row[off_diag], np.arange(n)])
+    col = np.concatenate([S_coo.col[off_diag], np.arange(n)])
+    data = np.concatenate(
+        [np.clip(1 - S_coo.data[off_diag], 0, 2), np.zeros(n, dtype=np.float64)]
+    )
+    D = sparse.csr_matrix((data, (row, col)), shape=S.shape)
+    return S, D
+
+
+def _dense_rows(matrix, fill: float = 0.0):
+    """逐行返回矩阵的稠密形式，稀疏矩阵中未存储的位置用 fill 填充。"""
+    if not sparse.issparse(matrix):
+        for row in matrix:
+            yield row
+        return
+    matrix = matrix.tocsr()
+    for idx in range(matrix.shape[0]):
+        start, end = matrix.indptr[idx], matrix.indptr[idx + 1]
+        row = np.full(matrix.shape[1], fill, dtype=np.float64)
+        row[matrix.indices[start:end]] = matrix.data[start:end]
+        yield row.tolist()
+
+
+class CosineNeighbors:
+    """基于余弦相似度的 top-k 近邻索引。
+
+    分块计算共现矩阵行向量之间的余弦相似度，每个tag只保留最相似的k个tag，
+    完整的 N×N 相似度矩阵不会出现在内存中，内存占用为 O(N·k)。
+
+    example:
+        ```python
+        index = CosineNeighbors.build(tags, frequency_matrix, k=20)
+        index.neighbors("abc", 5)  # [("bcd", 0.87), ("cde", 0.65), ...]
+        ```
+
+    Args:
+        tags (list): 标签list，与矩阵的行对应
+        indices (np.ndarray): N×k，每个tag的近邻的行号，-1表示没有近邻（相似度为0）
+        similarities (np.ndarray): N×k，对应的余弦相似度，按从大到小排列
+    """
+
+    def __init__(self, tags: list, indices: np.ndarray, similarities: np.ndarray):
+        self.tags = list(tags)
+        self.indices = indices
+        self.similarities = similarities
+        self._tag_index = {tag: idx for idx, tag in enumerate(self.tags)}
+
+    @property
+    def k(self) -> int:
+        """每个tag保存的近邻数目。"""
+        return self.indices.shape[1]
+
+    @classmethod
+    def build(cls, tags: list, frequency_matrix, k: int = 10, block_size: int = 256):
+        """
+        由共现矩阵分块构建近邻索引。
+
+        Args:
+            tags (list): 标签list
+            frequency_matrix: 共现矩阵，稀疏或稠密均可
+            k (int): 每个tag保留的近邻数目
+            block_size (int): 每次计算相似度的行数，每块占用 block_size×N 个浮点数的内存
+
+        Returns:
+            CosineNeighbors: 近邻索引
+        """
+        n = len(tags)
+        k = max(0, min(k, n - 1))
+        N = normalize(sparse.csr_matrix(frequency_matrix, dtype=np.float64), axis=1)
+        NT = N.T.tocsc()
+
+        indices = np.full((n, k), -1, dtype=np.int64)
+        similarities = np.zeros((n, k), dtype=np.float64)
+        if k == 0:
+            return cls(tags, indices, similarities)
+
+        for start in range(0, n, block_size):
+            end = min(start + block_size, n)
+            block = (N[start:end] @ NT).toarray()
+            rows = np.arange(end - start)
+            # 排除自身
+            block[rows, rows + start] = -np.inf
+
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_sim = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_sim, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_sim = np.take_along_axis(top_sim, order, axis=1)
+
+            top[top_sim <= 0] = -1
+            top_sim[top_sim <= 0] = 0
+            indices[start:end] = top
+            similarities[start:end] = top_sim
+
+        return cls(tags, indices, similarities)
+
+    def neighbors(self, tag, k: int = None) -> List[Tuple[Any, float]]:
+        """
+        查询某个tag最相似的k个tag。
+
+        Args:
+            tag: 要查询的tag
+            k (int): 默认为None，返回构建索引时保留的全部近邻
+
+        Returns:
+            List[Tuple]: [(tag, 余弦相似度), ...]，按相似度从大到小排列
+        """
+        idx = self._tag_index[tag]
+        k = self.k if k is None else min(k, self.k)
+        return [
+            (self.tags[j], float(sim))
+            for j, sim in zip(self.indices[idx, :k], self.similarities[idx, :k])
+            if j >= 0
+        ]
+
+    def to_sparse(self):
+        """转换为 N×N 的 CSR 矩阵，只存储每个tag的 top-k 相似度。"""
+        n = len(self.tags)
+        mask = self.indices >= 0
+        rows = np.repeat(np.arange(n), self.k).reshape(n, self.k)
+        return sparse.csr_matrix(
+            (self.similarities[mask], (rows[mask], self.indices[mask])), shape=(n, n)
+        )
+
+
+# 各矩阵保存时使用的文件名，顺序与 generate_CoMatrix 的返回值一致
+_MATRIX_NAMES = [
+    "frequency_matrix",
+    "ochiia_correlation_matrix",
+    "cosine_similarity_matrix",
+    "cosine_distances_matrix",
+]
+
+# 稀疏矩阵转为稠密形式时，未存储位置的取值
+_MATRIX_FILLS = [0.0, 0.0, 0.0, 1.0]
+
+
+def _save_matrix(path: str, labels: list, data, fill: float = 0.0):
+    """
+    保存到 csv
+    """
+    with open(path, "w") as f:
+        #  tsv_writer = csv.writer(f, delimiter="\t")
+        tsv_writer = csv.writer(f)
+        tsv_writer.writerow(["index"] + labels)
+        for idx, item in enumerate(_dense_rows(data, fill)):
+            row_ = list()
+            row_.append(labels[idx])
+            row_.extend(item)
+            tsv_writer.writerow(row_)
+
+
+def save_CoMatrix(dir_path: str, result: tuple, save_format: str = "npz"):
+    """
+    保存 `generate_CoMatrix` 的结果，已存在的同名文件(包括本次没有结果的矩阵的文件)会先被备份。
+
+    Args:
+        dir_path (str): 保存的目录
+        result (tuple): generate_CoMatrix 的返回值
+        save_format (str): 默认为 "npz"，以二进制格式保存：稀疏矩阵保存为 `.npz`，
+            稠密矩阵保存为可内存映射的 `.npy`，tags 保存为 `tags.json`，
+            可以用 `load_CoMatrix` 读取；"csv" 表示保存为 csv 文本矩阵。
+            近邻索引 `CosineNeighbors` 保存为只含 top-k 相似度的稀疏矩阵。
+    """
+    BASE_DIR = gf.new_dirs(dir_path)
+    kws = result[0]
+    matrices = [
+        matrix.to_sparse() if isinstance(matrix, CosineNeighbors) else matrix
+        for matrix in result[1:]
+    ]
+
+    if save_format == "csv":
+        for matrix, name, fill in zip(matrices, _MATRIX_NAMES, _MATRIX_FILLS):
+            path = os.path.join(BASE_DIR, name + ".csv")
+            # 没有结果的矩阵也要备份旧文件，避免与本次的结果混淆
+            gf.if_path_exist_then_backup(path)
+            if matrix is None:
+                continue
+            _save_matrix(path, kws, matrix, fill)
+    elif save_format == "npz":
+        path = os.path.join(BASE_DIR, "tags.json")
+        gf.if_path_exist_then_backup(path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(kws, f, ensure_ascii=False)
+        for matrix, name in zip(matrices, _MATRIX_NAMES):
+            # 同一个矩阵可能以 .npz 或 .npy 保存，两种文件都先备份，
+            # 否则 load_CoMatrix 会读到上一次保存的另一种格式的旧矩阵
+            path = os.path.join(BASE_DIR, name)
+            gf.if_path_exist_then_backup([path + ".npz", path + ".npy"])
+            if matrix is None:
+                continue
+            if sparse.issparse(matrix):
+                sparse.save_npz(path + ".npz", matrix.tocsr())
+            else:
+                np.save(path + ".npy", np.asarray(matrix))
+    else:
+        raise Exception("save_format's value should be 'csv' or 'npz'.")
+
+
+def load_CoMatrix(dir_path: str, mmap_mode: str = "r"):
+    """
+    读取 `save_CoMatrix` 以 npz 格式保存的结果。
+
+    稠密矩阵以内存映射的方式打开，用到时才从磁盘读取；稀疏矩阵读取为 CSR 矩阵。
+
+    Args:
+        dir_path (str): 保存结果的目录
+        mmap_mode (str): 稠密矩阵的内存映射模式，见 `np.load`，None 表示全部读入内存
+
+    Returns:
+        (tuple): 与 generate_CoMatrix 的返回值格式相同，没有保存的矩阵为 None
+    """
+    with open(os.path.join(dir_path, "tags.json"), encoding="utf-8") as f:
+        kws = json.load(f)
+
+    matrices = list()
+    for name in _MATRIX_NAMES:
+        path = os.path.join(dir_path, name)
+        if os.path.exists(path + ".npz"):
+            matrices.append(sparse.load_npz(path + ".npz").tocsr())
+        elif os.path.exists(path + ".npy"):
+            matrices.append(np.load(path + ".npy", mmap_mode=mmap_mode))
+        else:
+            matrices.append(None)
+
+    return (kws, *matrices)
+
+
+def _build_results(
+    dir_path: str,
+    kws: list,
+    frequency_vector,
+    frequencies: np.ndarray,
+    save: bool = False,
+    dense: bool = False,
+    save_format: str = "csv",
+    top_k: int = None,
+):
+    """由共现矩阵和tag频次计算其余矩阵，按需保存，返回 generate_CoMatrix 格式的结果。"""
+    # 相关矩阵
+    ochiia_correlation_vector = _ochiia_matrix(frequency_vector, frequencies)
+
+    if top_k is not None:
+        # 只保留每个tag的 top-k 近邻，不计算完整的余弦矩阵
+        cosine_similarity_vector = CosineNeighbors.build(kws, frequency_vector, top_k)
+        cosine_distances_vector = None
+        if dense:
+            frequency_vector = frequency_vector.toarray()
+            ochiia_correlation_vector = ochiia_correlation_vector.toarray()
+    elif dense:
+        frequency_vector = frequency_vector.toarray()
+        ochiia_correlation_vector = ochiia_correlation_vector.toarray()
+        # 计算余弦相似度
+        cosine_similarity_vector = cosine_similarity(frequency_vector)
+        # 计算余弦距离
+        cosine_distances_vector = cosine_distances(frequency_vector)
+    else:
+        cosine_similarity_vector, cosine_distances_vector = _cosine_matrices(
+            frequency_vector
+        )
+
+    result = (
+        kws,
+        frequency_vector,
+        ochiia_correlation_vector,
+        cosine_similarity_vector,
+        cosine_distances_vector,
+    )
+
+    # 保存为 csv 矩阵格式 或 二进制格式
+    if save:
+        save_CoMatrix(dir_path, result, save_format)
+
+    print("...done...")
+
+    return result
+
+
 @wonders.timing
 def generate_CoMatrix(
     dir_path: str,
@@ -29,160 +431,186 @@ def generate_CoMatrix(
     filter_num: int = 1,
     filter_tags: list = None,
     save: bool = False,
+    dense: bool = False,
+    process_num: int = 1,
+    save_format: str = "csv",
+    top_k: int = None,
 ):
     """
     生成共现矩阵。
 
+    基于 scipy.sparse 构建 文档×tag 的关联矩阵 X，共现矩阵由 X.T @ X 得到，
+    Ochiia相关矩阵、余弦相似度、余弦距离都以稀疏的方式计算。
+
+    数据量太大、无法一次性放入内存时，请使用 `CoMatrixAccumulator` 分批累加。
+
     Args:
         dir_path (str): 工作目录，生成文件的位置
         data (list): tags的列表，格式为 [["abc","bcd","cde"],["abc","cde","def"]]
         filter_num (int): 计算时只包含出现次数大于等于这个数值的tag
         filter_tags (list): 默认为None，只计算列表中包含的tag的共现矩阵；["abc", "cde"]表示只计算"abc","cde"的矩阵
         save (True): 默认为 False，不把向量保存到文件
+        dense (bool): 默认为 False，返回 scipy.sparse 的 CSR 矩阵；
+            True 时返回稠密的 np.ndarray，tag数量很大时请勿开启。
+            稀疏的余弦距离矩阵中，未存储的位置表示距离为 1。
+        process_num (int): 计算共现次数的进程数目，默认为1，即在当前进程中计算；
+            大于1时tag频次和共现次数都在子进程中分块计算，部分结果在主进程中合并。
+            **注意**：多进程时请在 `if __name__ == "__main__":` 下调用本函数。
+        save_format (str): 默认为 "csv"；"npz" 表示以二进制格式保存，见 `save_CoMatrix`
+        top_k (int): 默认为None；指定时不计算完整的余弦矩阵，余弦相似度的位置返回
+            每个tag只保留k个最相似tag的 `CosineNeighbors` 索引，余弦距离的位置返回 None
 
     Returns:
         (tuple): (tags, frequency_vector, ochiia_correlation_vector, cosine_similarity_vector, cosine_distances_vector)，分别表示：标签list，共现矩阵，相关矩阵，余弦相似度矩阵，余弦距离矩阵
 
     """
+    if process_num > 1:
+        # tag频次和共现频次矩阵都在子进程中分块计算
+        kws, frequency_vector, frequencies = _count_parallel(
+            data, filter_num, filter_tags, process_num
+        )
+    else:
+        # kw 出现的次数统计
+        kw_num_dict = Counter(chain.from_iterable(data))
+
+        # 关键词列表
+        kws = _select_tags(kw_num_dict, filter_num, filter_tags)
+
+        kw_index = {kw: idx for idx, kw in enumerate(kws)}
+
+        # 共现频次 矩阵
+        # 文档×关键词 的关联矩阵
+        X = _incidence_matrix(data, kw_index)
+        frequency_vector = _cooccurrence_matrix(X)
+        frequencies = np.asarray(X.sum(axis=0), dtype=np.float64).ravel()
+
+    return _build_results(
+        dir_path, kws, frequency_vector, frequencies, save, dense, save_format, top_k
+    )
 
-    def save_matrix(path: str, labels: list, data: list):
-        """
-        保存到 csv
-        """
-        with open(path, "a+") as f:
-            #  tsv_writer = csv.writer(f, delimiter="\t")
-            tsv_writer = csv.writer(f)
-            tsv_writer.writerow(["index"] + labels)
-            for idx, item in enumerate(data):
-                row_ = list()
-                row_.append(labels[idx])
-                row_.extend(item)
-                tsv_writer.writerow(row_)
-
-    # 工作目录
-    BASE_DIR = gf.new_dirs(dir_path)[0]
-
-    # kw 出现的次数统计
-    kw_num_dict = defaultdict(int)
-    for item in data:
-        for kw in item:
-            kw_num_dict[kw] += 1
-    #  print(kw_num_dict)
 
-    # 依据频次对关键词进行过滤
-    kw_num_filter_dict = defaultdict(int)
-    for kw, num in kw_num_dict.items():
-        if num >= filter_num:
-            kw_num_filter_dict[kw] = num
+class CoMatrixAccumulator:
+    """共现矩阵的增量累加器。
 
-    kw_num_dict = kw_num_filter_dict
+    分批输入tags列表，只保存tag的频次和稀疏的两两共现次数，不需要把全部数据放入内存；
+    在不同进程中构建的累加器可以通过 `merge` 合并，最后调用 `result` 得到与
+    `generate_CoMatrix` 格式相同的结果。
 
-    # 关键词列表
-    kws = list(kw_num_dict.keys())
+    example:
+        ```python
+        acc = CoMatrixAccumulator(parser=lambda line: line.split(";"))
+        gf.read_txt_by_page("tags.txt", acc.update, page_size=10000)
+        tags, freq, ochiia, cos_sim, cos_dist = acc.result("./comatrix/", filter_num=5)
+        ```
 
-    # 如果同时指定了 filter_num 和 filter_kws ，
-    # 那么需要对两种情况下的关键词列表取交集
-    if filter_tags:
-        kws = list(set(kws).intersection(set(filter_tags)))
-    kws = sorted(kws)
-
-    # 两两组合出现的次数
-    pair_count_dict = defaultdict(int)
-    for item in data:
-        pairs = list(product(item, item))
-        for pair in pairs:
-            if pair[0] in set(kws) and pair[1] in set(kws):
-                pair_count_dict[pair] += 1
-
-    # 若 pair 中的两个词汇一样，那么共现次数设置为0
-    pair_count_dict = dict(
-        [
-            (pair, 0 if pair[0] == pair[1] else count)
-            for pair, count in pair_count_dict.items()
-        ]
-    )
-
-    # 转换为数据结构，因为每个词汇可能和多个词汇组成pair
-    # 转换为以 {'kw1':{'kw2':2,'kw3':4}}的结构，
-    # 表示 kw1 和 kw2 共现 2 次，和 kw3 共现4 次。
-    kw_kw_dict = defaultdict(dict)
-    for pair, count in pair_count_dict.items():
-        kw_kw_dict[pair[0]][pair[1]] = count
-
-    # 补全，有的kw之间共现为0，补全一下
-    for kw, kw_count in kw_kw_dict.items():
-        already_kws = set(kw_count.keys())
-        diffs = set(kws).difference(already_kws)
-        for diff in diffs:
-            kw_kw_dict[kw][diff] = 0
-
-    # 对 kw_kw_dict 排序，以及对kw的kw_dict排序
-    kw_kw_dict = gb.dict_sorted(kw_kw_dict, 0)
-    kw_kw_dict = dict(
-        [(kw, gb.dict_sorted(kw_count, 0)) for kw, kw_count in kw_kw_dict.items()]
-    )
+    Args:
+        parser (Callable): 默认为None，表示每条记录已经是tag的list；
+            否则用来把每条记录（如文本行、mongo文档）转换为tag的list。
+            需要跨进程传递累加器时，parser 应当是顶层定义的函数。
+    """
 
-    # 转为向量的格式
-    kw_vector_dict = dict()
-    for kw, kw_count in kw_kw_dict.items():
-        kw_vector_dict[kw] = list(kw_count.values())
-
-    # 共现频次 矩阵
-    frequency_vector = list()
-
-    # Ochiia系数将共词矩阵转换为相关矩阵
-    # ochiia = kw1_kw2共现次数 / ( kw2频次平方根*kw2频次平方根 )
-    correlation_matrix_dict = defaultdict(dict)
-    for kw, kw_count in kw_kw_dict.items():
-        frequency_vector.append(list(kw_count.values()))
-        for kw_sub, count in kw_count.items():
-            ochiia = count / (
-                math.sqrt(kw_num_dict[kw]) * math.sqrt(kw_num_dict[kw_sub])
+    def __init__(self, parser: Callable[[Any], list] = None):
+        self.parser = parser
+        self.doc_count = 0
+        self._kws = list()
+        self._kw_index = dict()
+        self._frequencies = np.zeros(0, dtype=np.int64)
+        self._pair_counts = sparse.csr_matrix((0, 0), dtype=np.int64)
+
+    @property
+    def tags(self) -> list:
+        """已经出现过的所有tag，按首次出现的顺序排列。"""
+        return list(self._kws)
+
+    def _add_tags(self, kws: Iterable):
+        """把新的tag加入词表，并扩充频次向量和共现矩阵。"""
+        size = len(self._kws)
+        for kw in kws:
+            if kw not in self._kw_index:
+                self._kw_index[kw] = len(self._kws)
+                self._kws.append(kw)
+        n = len(self._kws)
+        if n > size:
+            self._frequencies = np.concatenate(
+                [self._frequencies, np.zeros(n - size, dtype=np.int64)]
             )
-            correlation_matrix_dict[kw][kw_sub] = ochiia
+            self._pair_counts.resize((n, n))
 
-    # 相关矩阵
-    ochiia_correlation_vector = [
-        list(val.values()) for kw, val in correlation_matrix_dict.items()
-    ]
+    def update(self, batch: list):
+        """
+        累加一批数据，可以直接作为 `read_txt_by_page`、`aggregate_by_page` 的 parse_func。
 
-    # 计算余弦相似度
-    cosine_similarity_vector = cosine_similarity(frequency_vector)
+        Args:
+            batch (list): 一批记录，每条记录经 parser 转换后为tag的list。
 
-    # 计算余弦距离
-    cosine_distances_vector = cosine_distances(frequency_vector)
+        Returns:
+            CoMatrixAccumulator: self
+        """
+        if self.parser is not None:
+            batch = [self.parser(record) for record in batch]
+        self._add_tags(chain.from_iterable(batch))
 
-    # 保存为 csv 矩阵格式
-    if save:
-        for vector, name in zip(
-            [
-                frequency_vector,
-                ochiia_correlation_vector,
-                cosine_similarity_vector,
-                cosine_distances_vector,
-            ],
-            [
-                "frequency_vector",
-                "ochiia_correlation_vector",
-                "cosine_similarity_vector",
-                "cosine_distances_vector",
-            ],
-        ):
-            save_matrix(
-                "{}/{}.csv".format(BASE_DIR, name).replace("_vector", "_matrix"),
-                kws,
-                vector,
-            )
+        X = _incidence_matrix(batch, self._kw_index)
+        self._frequencies += np.asarray(X.sum(axis=0), dtype=np.int64).ravel()
+        self._pair_counts = (self._pair_counts + _cooccurrence_matrix(X)).tocsr()
+        self.doc_count += X.shape[0]
+        return self
 
-    print("...done...")
+    def merge(self, other: "CoMatrixAccumulator"):
+        """
+        合并另一个累加器（例如其他进程中构建的）的计数结果。
 
-    return (
-        kws,
-        frequency_vector,
-        ochiia_correlation_vector,
-        cosine_similarity_vector,
-        cosine_distances_vector,
-    )
+        Args:
+            other (CoMatrixAccumulator): 另一个累加器。
+
+        Returns:
+            CoMatrixAccumulator: self
+        """
+        self._add_tags(other._kws)
+        remap = np.array([self._kw_index[kw] for kw in other._kws], dtype=np.int64)
+        n = len(self._kws)
+
+        self._frequencies[remap] += other._frequencies
+        pairs = other._pair_counts.tocoo()
+        self._pair_counts = (
+            self._pair_counts
+            + sparse.csr_matrix(
+                (pairs.data, (remap[pairs.row], remap[pairs.col])), shape=(n, n)
+            )
+        ).tocsr()
+        self.doc_count += other.doc_count
+        return self
+
+    def result(
+        self,
+        dir_path: str,
+        filter_num: int = 1,
+        filter_tags: list = None,
+        save: bool = False,
+        dense: bool = False,
+        save_format: str = "csv",
+        top_k: int = None,
+    ):
+        """
+        由累加的计数生成共现矩阵等结果，参数和返回值与 `generate_CoMatrix` 相同。
+        """
+        kw_num_dict = dict(zip(self._kws, self._frequencies.tolist()))
+        kws = _select_tags(kw_num_dict, filter_num, filter_tags)
+        idx = np.array([self._kw_index[kw] for kw in kws], dtype=np.int64)
+
+        frequency_vector = self._pair_counts[idx][:, idx].tocsr()
+        frequencies = self._frequencies[idx].astype(np.float64)
+
+        return _build_results(
+            dir_path,
+            kws,
+            frequency_vector,
+            frequencies,
+            save,
+            dense,
+            save_format,
+            top_k,
+        )
 
 
 #  if __name__ == "__main__":
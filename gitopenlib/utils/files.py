@@ -7,7 +7,7 @@
 # @Date   :  2020-10-29 13:38:36
 # @Description :  有关文件操作的相关工具函数
 
-__version__ = "1.06.06"
+__version__ = "1.06.07"
 
 import asyncio
 import json
@@ -184,6 +184,8 @@ def check_path(pathes: Union[str, List[str]]):
 def if_path_exist_then_backup(pathes: Union[str, List[str]]) -> bool:
     """检查路径是否存在，如路径存在，则备份。
 
+    备份文件名中的时间精确到微秒，同名的备份文件已存在时再加上序号，不会覆盖之前的备份。
+
     Args:
         pathes:
             路径，可以是单个字符串或者字符串的列表。
@@ -198,11 +200,17 @@ def if_path_exist_then_backup(pathes: Union[str, List[str]]) -> bool:
     for path in pathes:
         path = Path(path)
         if path.exists():
-            new_suffix = ".{}{}".format(
-                str(time.strftime("%Y%m%d_%H%M%S", time.localtime())),
-                path.suffix,
+            now = time.time()
+            stamp = "{}_{:06d}".format(
+                time.strftime("%Y%m%d_%H%M%S", time.localtime(now)),
+                int(now % 1 * 1e6),
             )
-            path.rename(path.with_suffix(new_suffix))
+            backup = path.with_suffix(".{}{}".format(stamp, path.suffix))
+            count = 1
+            while backup.exists():
+                backup = path.with_suffix(".{}_{}{}".format(stamp, count, path.suffix))
+                count += 1
+            path.rename(backup)
             has_backup_files = True
     return has_backup_files
 
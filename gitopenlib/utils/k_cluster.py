@@ -7,10 +7,12 @@
 # @Date   :  2021-03-16 16:07:34
 # @Description :  使用k-mean++算法进行聚类
 
-__version__ = "0.1.0"
+__version__ = "0.1.3"
 
 import json
 import os
+from multiprocessing import Pool
+from typing import Union
 
 import joblib
 import matplotlib.pyplot as plt
@@ -20,11 +22,120 @@ from gitopenlib.utils import wonders
 from matplotlib.axes import Axes
 from matplotlib.figure import Figure
 from sklearn.cluster import KMeans
-from sklearn.metrics import calinski_harabasz_score, silhouette_score
+from sklearn.metrics import (
+    calinski_harabasz_score,
+    pairwise_distances_argmin,
+    silhouette_score,
+)
+
+# 子进程共享的特征数据和聚类参数，由 _init_worker 设置
+_shared_data = None
+_shared_params = None
+
+
+def _init_worker(data: np.ndarray, params: tuple):
+    """进程池的初始化函数，每个子进程只接收一次特征数据。"""
+    global _shared_data, _shared_params
+    _shared_data = data
+    _shared_params = params
+
+
+def _fit_k(data: np.ndarray, k: int, random_state: int, silhouette_sample: int = None):
+    """对一个K值进行聚类，并计算各项评价指标。"""
+    kmeans = KMeans(n_clusters=k, random_state=random_state).fit(X=data)
+
+    # # 评价指标，经实验观察，当以下评价指标的线型图中，
+    # # 首次出现曲率最大的转折点，就是最优的聚类类别数目
+    # 使用Silhouette Coefficient 评价，轮廓系数
+    # Silhouette Coefficient是对象与其自身簇（内聚力）相比与其他簇（分离）相似程度的度量。
+    # 值从-1到+1，其中高值表示对象与其自己的簇很好地匹配并且与相邻簇不匹配。
+    # 如果大多数对象具有高值，则聚类结果是合适的。 如果许多点具有低值或负值，则聚类效果不好，可能具有太多或太少的簇。
+    # 最大值的那个位置就是聚类最好的位置
+    # 轮廓系数的复杂度为O(n²)，silhouette_sample 不为None时只在随机抽取的样本上计算
+    if silhouette_sample is not None and silhouette_sample >= len(data):
+        silhouette_sample = None
+    sil_coeff = silhouette_score(
+        data,
+        kmeans.labels_,
+        metric="euclidean",
+        sample_size=silhouette_sample,
+        random_state=random_state,
+    )
+
+    # 使用between_ss，组内平方误差和法
+    # 是组间平方和与总的距离平方和的商
+    # 越小越好
+    bss = sum_of_square_scores(
+        data, kmeans.labels_, kmeans.cluster_centers_, kmeans.n_clusters
+    )
+
+    # 使用 calinski_harabaz_score 方法评价聚类效果的好坏,大概是类间距除以类内距，因此这个值越大越好
+    # 越大越好
+    chs = calinski_harabasz_score(data, kmeans.labels_)
+
+    # 使用 SSE 均方误差
+    # SSE越接近于0，说明模型选择和拟合更好，数据预测也越成功
+    sse = kmeans.inertia_
+
+    return kmeans, sil_coeff, bss, chs, sse
+
+
+def _fit_k_shared(k: int):
+    """子进程中对一个K值进行聚类，特征数据来自 _init_worker。"""
+    return _fit_k(_shared_data, k, *_shared_params)
+
+
+def _elbow_k(Ks: list, sse_list: list) -> int:
+    """
+    肘部法则：将K值和SSE都缩放到[0, 1]后，
+    SSE曲线上距离首尾两点连线最远的点即为拐点。
+    """
+    x = np.asarray(Ks, dtype=np.float64)
+    y = np.asarray(sse_list, dtype=np.float64)
+    if len(x) < 3:
+        return Ks[0]
+    x = (x - x[0]) / (x[-1] - x[0])
+    y_range = y.max() - y.min()
+    if y_range == 0:
+        return Ks[0]
+    y = (y - y.min()) / y_range
+    # 点到直线的距离(省略了相同的分母)
+    dist = np.abs((y[-1] - y[0]) * x - (x[-1] - x[0]) * y + x[-1] * y[0] - y[-1] * x[0])
+    return Ks[int(np.argmax(dist))]
+
+
+def _select_k(
+    select_k: Union[str, int], Ks: list, sil_coeff_list, chs_list, sse_list
+) -> int:
+    """根据 select_k 指定的方法自动选择K值。"""
+    if isinstance(select_k, (int, np.integer)):
+        if select_k not in Ks:
+            raise ValueError(f"select_k {select_k} is not in {Ks}.")
+        return int(select_k)
+    if select_k == "silhouette":
+        return Ks[int(np.argmax(sil_coeff_list))]
+    if select_k == "chs":
+        return Ks[int(np.argmax(chs_list))]
+    if select_k == "elbow":
+        return _elbow_k(Ks, sse_list)
+    raise ValueError(
+        f"Unknown select_k: {select_k}, "
+        + "expected 'silhouette', 'chs', 'elbow' or an int."
+    )
 
 
 @wonders.timing
-def run_kmeans(K_range: list, data: list, tags: list, base_dir: str):
+def run_kmeans(
+    K_range: list,
+    data: list,
+    tags: list,
+    base_dir: str,
+    process_num: int = 1,
+    silhouette_sample: int = None,
+    select_k: Union[str, int] = None,
+    show: bool = True,
+    random_state: int = 10,
+):
     """
     data 是一个 list 类型，其中的每一个 sublist 都和 labels 中的标签对应
 
@@ -33,9 +144,20 @@ def run_kmeans(K_range: list, data: list, tags: list, base_dir: str):
         data (list): 特征数据集，元素是list类型的特征数据
         tags (list): 每一个特征数据对应的标签
         base_dir (str): 工作目录，在该目录下生成一系列的文件和聚类结果
+        process_num (int): 进程数目，大于1时使用进程池并行地对各个K值进行聚类。
+        silhouette_sample (int): 计算轮廓系数时随机抽取的样本数，默认为None，使用全部数据；
+            轮廓系数的复杂度为O(n²)，数据量大时建议设置。
+        select_k (str or int): 选择K值的方式，默认为None，画图后由用户输入；
+            "silhouette"：轮廓系数最大的K值；
+            "chs"：Calinski Harabaz Score 最大的K值；
+            "elbow"：SSE曲线的拐点(肘部法则)；
+            int：直接使用该K值。
+        show (bool): 是否调用`plt.show()`显示图像，为False时将图像保存到 base_dir 中；
+            在批处理任务中，设置 show=False 并指定 select_k，即可完全不需要交互。
+        random_state (int): KMeans 和轮廓系数抽样的随机数种子。
 
     """
-    BASE_DIR = gf.new_dirs(base_dir)[0]
+    BASE_DIR = gf.new_dirs(base_dir)
 
     Ks = list(range(K_range[0], K_range[1] + 1))
     models = list()
@@ -44,42 +166,24 @@ def run_kmeans(K_range: list, data: list, tags: list, base_dir: str):
     chs_list = list()
     sse_list = list()
 
-    for k_ in Ks:
+    # # 进行聚类
+    X = np.asarray(data)
+    params = (random_state, silhouette_sample)
+    if process_num > 1:
+        with Pool(process_num, initializer=_init_worker, initargs=(X, params)) as pool:
+            results = pool.map(_fit_k_shared, Ks, chunksize=1)
+    else:
+        results = [_fit_k(X, k_, *params) for k_ in Ks]
+
+    for k_, (kmeans, sil_coeff, bss, chs, sse) in zip(Ks, results):
         # # 创建存放结果的文件夹
         print(f"#1# the n_clusters is: {k_}")
-        base_k_dir = gf.new_dirs(BASE_DIR + f"clusters/{k_}/")[0]
+        base_k_dir = gf.new_dirs(os.path.join(BASE_DIR, "clusters", str(k_)))
 
-        # # 进行聚类
-        random_state = 10
-        kmeans = KMeans(n_clusters=k_, random_state=random_state).fit(X=data)
         models.append(kmeans)
-
-        # # 评价指标，经实验观察，当以下评价指标的线型图中，
-        # # 首次出现曲率最大的转折点，就是最优的聚类类别数目
-        # 使用Silhouette Coefficient 评价，轮廓系数
-        # Silhouette Coefficient是对象与其自身簇（内聚力）相比与其他簇（分离）相似程度的度量。
-        # 值从-1到+1，其中高值表示对象与其自己的簇很好地匹配并且与相邻簇不匹配。
-        # 如果大多数对象具有高值，则聚类结果是合适的。 如果许多点具有低值或负值，则聚类效果不好，可能具有太多或太少的簇。
-        # 最大值的那个位置就是聚类最好的位置
-        sil_coeff = silhouette_score(data, kmeans.labels_, metric="euclidean")
         sil_coeff_list.append(sil_coeff)
-
-        # 使用between_ss，组内平方误差和法
-        # 是组间平方和与总的距离平方和的商
-        # 越小越好
-        bss = sum_of_square_scores(
-            data, kmeans.labels_, kmeans.cluster_centers_, kmeans.n_clusters
-        )
         bss_list.append(bss)
-
-        # 使用 calinski_harabaz_score 方法评价聚类效果的好坏,大概是类间距除以类内距，因此这个值越大越好
-        # 越大越好
-        chs = calinski_harabasz_score(data, kmeans.labels_)
         chs_list.append(chs)
-
-        # 使用 SSE 均方误差
-        # SSE越接近于0，说明模型选择和拟合更好，数据预测也越成功
-        sse = kmeans.inertia_
         sse_list.append(sse)
 
         # 将聚类结果的一些参数写入文件中，方便后续检验和观察
@@ -125,19 +229,27 @@ def run_kmeans(K_range: list, data: list, tags: list, base_dir: str):
 
     ax.legend()
 
-    plt.show()
-
-    # 让用户判断哪个K值是合适的
-    user_command = input("请输入您选择的K值，若输入N，则直接退出:\n")
-    if user_command == "N" or user_command == "n":
-        os._exit(0)
-
-    # 捕捉异常
-    try:
-        k_best = int(user_command)
-    except ValueError as e:
-        print(e)
-        os._exit(1)
+    if show:
+        plt.show()
+    else:
+        fig.savefig(os.path.join(BASE_DIR, "k_metrics.png"))
+        plt.close(fig)
+
+    if select_k is not None:
+        k_best = _select_k(select_k, Ks, sil_coeff_list, chs_list, sse_list)
+        print(f"#2# the selected n_clusters is: {k_best}")
+    else:
+        # 让用户判断哪个K值是合适的
+        user_command = input("请输入您选择的K值，若输入N，则直接退出:\n")
+        if user_command == "N" or user_command == "n":
+            os._exit(0)
+
+        # 捕捉异常
+        try:
+            k_best = int(user_command)
+        except ValueError as e:
+            print(e)
+            os._exit(1)
 
     # 得到模型
     km = models[Ks.index(k_best)]
@@ -145,40 +257,29 @@ def run_kmeans(K_range: list, data: list, tags: list, base_dir: str):
     labels_ = km.labels_
     # 质心，质心分类号 与 质心标签的关系数据
     centers = km.cluster_centers_
-    # 求出与每个质心（中心）距离最近的一个 样本点
-    center_sample_points = list()
+    # 求出与每个质心（中心）距离最近的一个 样本点的索引，
+    # 距离矩阵由 sklearn 分块计算，内存占用与样本数无关
+    center_sample_idx = pairwise_distances_argmin(centers, X)
+    # 质心最近样本点
+    center_sample_points = X[center_sample_idx].tolist()
     # 求质心最近样本点所属的聚类类别
-    center_sample_labels = list()
+    center_sample_labels = labels_[center_sample_idx].tolist()
     # 求质心最近样本点的tag
-    center_sample_tags = list()
-    for center in centers:
-        dist_list = list()
-        for idx, val in enumerate(data):
-            dist = np.linalg.norm(center - np.array(val))
-            dist_list.append(dist)
-        dist_min = min(dist_list)
-        dist_min_idx = dist_list.index(dist_min)
-        point = data[dist_min_idx]
-        center_sample_points.append(list(point))
-        label = labels_[dist_min_idx]
-        center_sample_labels.append(label)
-        tag = tags[dist_min_idx]
-        center_sample_tags.append(tag)
+    center_sample_tags = [tags[idx] for idx in center_sample_idx]
 
     # 如果是二维的数据，那么画出来聚类结果
     # 可视化结果
     # 画出所有样例点，属于同一类的绘制同样的颜色
-    if len(data[0]) == 2:
+    if X.shape[1] == 2:
         colors = plt.cm.Spectral(np.linspace(0, 1, k_best))
-        for idx, val in enumerate(data):
-            plt.plot(
-                val[0],
-                val[1],
-                marker="o",
-                color=colors[int(labels_[idx])],
-                markeredgecolor="black",
-                markersize=6,
-            )
+        plt.scatter(
+            X[:, 0],
+            X[:, 1],
+            marker="o",
+            c=colors[labels_],
+            edgecolors="black",
+            s=36,
+        )
 
         # 画出质点，用特殊图型
         for i in range(k_best):
@@ -199,13 +300,17 @@ def run_kmeans(K_range: list, data: list, tags: list, base_dir: str):
                 markeredgecolor="red",
                 markersize=10,
             )
-        plt.show()
+        if show:
+            plt.show()
+        else:
+            plt.savefig(os.path.join(BASE_DIR, "clusters.png"))
+            plt.close()
 
     # 将聚类好的数据进行格式化整理
     # 保存模型
-    joblib.dump(km, BASE_DIR + "/km_model.pkl")
+    joblib.dump(km, os.path.join(BASE_DIR, "km_model.pkl"))
     # 载入模型
-    #  joblib.load(BASE_DIR + "/km_model.pkl")
+    #  joblib.load(os.path.join(BASE_DIR, "km_model.pkl"))
 
     # 保存质心、质心最近点，质心最近点类别
     # {"centers":[], "center_sample":[],"label":[]}
@@ -232,23 +337,22 @@ def run_kmeans(K_range: list, data: list, tags: list, base_dir: str):
 
     # 对于一个聚类类别，将数据格式化为如下格式
     # {"center_tag":xxx,"label":xxxx,"tags":[..., ..., ...]}
+    # 按类别稳定排序后，同一类别的样本是连续的一段，不必每个类别都遍历一次 labels_
+    order = np.argsort(labels_, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(labels_, minlength=k_best))))
+    data_list = X.tolist()
     cluster_dict = {"clusters": list()}
-    for csp, csl in zip(center_sample_points, center_sample_labels):
+    for idx, csl in zip(center_sample_idx, center_sample_labels):
         cluster = dict()
 
-        tag_idx = int(data.index(csp))
-        center_tag = tags[tag_idx]
-
         cluster["center_tag"] = dict()
-        cluster["center_tag"]["tag"] = center_tag
-        cluster["center_tag"]["data"] = csp
+        cluster["center_tag"]["tag"] = tags[idx]
+        cluster["center_tag"]["data"] = data_list[idx]
         cluster["label"] = int(csl)
-        cluster["tags"] = list()
-        for index_, label_ in enumerate(labels_):
-            if label_ == csl:
-                tag_ = tags[index_]
-                data_ = list(data[index_])
-                cluster["tags"].append({"tag": tag_, "data": data_})
+        cluster["tags"] = [
+            {"tag": tags[index_], "data": data_list[index_]}
+            for index_ in order[bounds[csl] : bounds[csl + 1]]
+        ]
 
         cluster_dict["clusters"].append(cluster)
 
@@ -265,20 +369,43 @@ def run_kmeans(K_range: list, data: list, tags: list, base_dir: str):
     return labels, center_dict, cluster_dict
 
 
-def sum_of_square_scores(original_data, predict_labels, cluster_centers, n_clusters):
+def sum_of_square_scores(
+    original_data,
+    predict_labels,
+    cluster_centers,
+    n_clusters,
+    chunksize: int = None,
+):
     """
     定义between_SS / total_SS 的计算方法
+
+    全部为数组运算，按标签取出每个样本所属的质心后相减，
+    再用 np.bincount 按类别累加组内平方和；float32 的数据按 float64 累加。
+    chunksize 不为None时按行分块计算，临时数组的大小只有一块，
+    original_data 可以是 np.memmap 这样不便一次读入内存的数组。
     """
-    avg = np.mean(original_data, axis=0)
-    dist = np.power(original_data - avg, 2)
-    total_ss = np.sum(dist)
-    within_squares = np.zeros((n_clusters, len(original_data[0])))
-    for i in range(0, len(original_data)):
-        cluster = predict_labels[i]
-        within_squares[cluster] += np.power(
-            original_data[i] - cluster_centers[cluster], 2
+    data = np.asarray(original_data)
+    labels = np.asarray(predict_labels)
+    centers = np.asarray(cluster_centers)
+    n = len(data)
+    step = n if chunksize is None else chunksize
+
+    total = np.zeros(data.shape[1], dtype=np.float64)
+    for start in range(0, n, step):
+        total += data[start : start + step].sum(axis=0, dtype=np.float64)
+    avg = total / n
+
+    total_ss = 0.0
+    within_squares = np.zeros(n_clusters, dtype=np.float64)
+    for start in range(0, n, step):
+        block = data[start : start + step]
+        block_labels = labels[start : start + step]
+        total_ss += np.square(block - avg).sum()
+        within = np.square(block - centers[block_labels]).sum(axis=1, dtype=np.float64)
+        within_squares += np.bincount(
+            block_labels, weights=within, minlength=n_clusters
         )
-    within_ss = np.sum(within_squares)
+    within_ss = within_squares.sum()
     return (total_ss - within_ss) / total_ss
 
 
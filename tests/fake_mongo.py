@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2026
+# @Author :  GitOPEN
+# @Email  :  gitopen@gmail.com
+# @Date   :  2026-10-17 15:20:08
+# @Description :  测试用的进程内 MongoDB 替身，只实现 helpers.mongo 用到的接口
+
+
+import asyncio
+import random
+import threading
+import time
+
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+from pymongo.results import BulkWriteResult
+
+
+def _match(doc: dict, query: dict) -> bool:
+    """支持等值、`$gt`、`$gte`、`$lt`、`$lte`的查询条件。"""
+    for key, cond in query.items():
+        value = doc.get(key)
+        if not isinstance(cond, dict):
+            if value != cond:
+                return False
+            continue
+        for op, target in cond.items():
+            if op == "$gt" and not value > target:
+                return False
+            if op == "$gte" and not value >= target:
+                return False
+            if op == "$lt" and not value < target:
+                return False
+            if op == "$lte" and not value <= target:
+                return False
+    return True
+
+
+class FakeCursor:
+    """同步游标，支持 limit、batch_size 和 with 语句。
+
+    每从"服务器"取一批(batch_size 条)数据，等待 latency 秒，模拟网络往返。
+    """
+
+    def __init__(self, docs: list, latency: float = 0.0):
+        self._docs = docs
+        self._iter = None
+        self._latency = latency
+        self._batch_size = 101
+        self._count = 0
+
+    def limit(self, n: int):
+        self._docs = self._docs[:n]
+        return self
+
+    def batch_size(self, n: int):
+        self._batch_size = n
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iter is None:
+            self._iter = iter(self._docs)
+        if self._latency and self._count % self._batch_size == 0:
+            time.sleep(self._latency)
+        self._count += 1
+        return next(self._iter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+
+class FakeCollection:
+    """同步 Collection 替身，数据保存在内存中。
+
+    plan 是依次用于每次`bulk_write`调用的行为：
+        "ok": 正常写入；
+        "net": 不写入，抛出 AutoReconnect；
+        "net_after_write": 写入后抛出 AutoReconnect，模拟确认丢失；
+        "stepdown": 偶数位置的操作返回暂时性错误(189)，其余正常写入；
+        "write_concern": 写入后返回 write concern 错误。
+    """
+
+    def __init__(self, docs: list = None, plan: list = None, latency: float = 0.0):
+        self.docs = sorted(docs or [], key=lambda doc: doc["_id"])
+        self.plan = list(plan or [])
+        self.latency = latency
+        self.bulk_calls = list()
+        self._lock = threading.Lock()
+
+    def _select(self, query: dict) -> list:
+        with self._lock:
+            return [doc for doc in self.docs if _match(doc, query or {})]
+
+    def find(self, filter=None, projection=None, sort=None, session=None):
+        return FakeCursor(self._select(filter), self.latency)
+
+    def find_one(self, filter=None, projection=None, sort=None):
+        docs = self._select(filter)
+        if sort is not None and sort[0][1] < 0:
+            docs.reverse()
+        return docs[0] if docs else None
+
+    def aggregate(self, pipeline: list, session=None, **kwargs):
+        docs = self._select(None)
+        for stage in pipeline:
+            ((op, arg),) = stage.items()
+            if op == "$match":
+                docs = [doc for doc in docs if _match(doc, arg)]
+            elif op == "$sort":
+                docs.sort(key=lambda doc: doc["_id"])
+            elif op == "$limit":
+                docs = docs[:arg]
+            elif op == "$sample":
+                docs = random.sample(docs, min(arg["size"], len(docs)))
+            elif op == "$project":
+                # 与 MongoDB 相同，默认保留`_id`
+                keys = dict({"_id": 1}, **arg)
+                docs = [
+                    {key: doc[key] for key in keys if keys[key] and key in doc}
+                    for doc in docs
+                ]
+            elif op == "$addFields":
+                docs = [dict(doc, **arg) for doc in docs]
+        return FakeCursor(docs, self.latency)
+
+    def estimated_document_count(self) -> int:
+        return len(self.docs)
+
+    def _apply(self, op, index: int, result: dict, errors: list):
+        """执行一个写操作，重复的`_id`记为11000错误。"""
+        ids = {doc["_id"]: doc for doc in self.docs}
+        if isinstance(op, InsertOne):
+            if op._doc["_id"] in ids:
+                errors.append({"index": index, "code": 11000, "errmsg": "dup key"})
+                return
+            self.docs.append(dict(op._doc))
+            result["nInserted"] += 1
+            return
+        doc = ids.get(op._filter.get("_id"))
+        if doc is None:
+            if op._upsert:
+                new = {"_id": op._filter["_id"]}
+                new.update(op._doc if isinstance(op, ReplaceOne) else op._doc["$set"])
+                self.docs.append(new)
+                result["nUpserted"] += 1
+            return
+        result["nMatched"] += 1
+        result["nModified"] += 1
+        if isinstance(op, UpdateOne):
+            doc.update(op._doc["$set"])
+        else:
+            doc.clear()
+            doc.update(op._doc, _id=op._filter["_id"])
+
+    def bulk_write(self, ops: list, ordered: bool = True):
+        assert ordered is False
+        mode = self.plan.pop(0) if self.plan else "ok"
+        self.bulk_calls.append(len(ops))
+        if mode == "net":
+            raise AutoReconnect("connection closed")
+        result = dict.fromkeys(
+            ["nInserted", "nMatched", "nModified", "nUpserted", "nRemoved"], 0
+        )
+        errors = list()
+        with self._lock:
+            for index, op in enumerate(ops):
+                if mode == "stepdown" and index % 2 == 0:
+                    errors.append({"index": index, "code": 189, "errmsg": "stepdown"})
+                    continue
+                self._apply(op, index, result, errors)
+            self.docs.sort(key=lambda doc: doc["_id"])
+        if mode == "net_after_write":
+            raise AutoReconnect("connection closed")
+        concern_errors = list()
+        if mode == "write_concern":
+            concern_errors.append({"code": 64, "errmsg": "waiting for replication"})
+        if errors or concern_errors:
+            result["writeErrors"] = errors
+            result["writeConcernErrors"] = concern_errors
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+
+class FakeManageDB:
+    """`mongo.ManageDB`的替身，所有的 coll 都返回同一个 FakeCollection。"""
+
+    collection = None
+
+    def __init__(self, **kwargs):
+        pass
+
+    def client(self):
+        return self
+
+    def coll(self, db_name: str, collection_name: str):
+        return self.collection
+
+    def close(self):
+        pass
+
+
+class AsyncFakeCursor:
+    """异步游标，每次`to_list`等待 latency 秒，模拟一次网络往返。"""
+
+    def __init__(self, cursor: FakeCursor, latency: float = 0.0):
+        self._cursor = cursor
+        self._latency = latency
+
+    def batch_size(self, n: int):
+        return self
+
+    async def to_list(self, length: int = None) -> list:
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        data = list()
+        for doc in self._cursor:
+            data.append(doc)
+            if length is not None and len(data) >= length:
+                break
+        return data
+
+    async def close(self):
+        pass
+
+
+class AsyncFakeCollection:
+    """异步 Collection 替身，接口与 pymongo 的 AsyncCollection 相同。"""
+
+    def __init__(self, docs: list = None, latency: float = 0.0):
+        self.sync = FakeCollection(docs)
+        self.latency = latency
+
+    @property
+    def docs(self) -> list:
+        return self.sync.docs
+
+    def find(self, *args, **kwargs):
+        return AsyncFakeCursor(self.sync.find(*args, **kwargs), self.latency)
+
+    async def aggregate(self, *args, **kwargs):
+        return AsyncFakeCursor(self.sync.aggregate(*args, **kwargs), self.latency)
+
+    async def find_one(self, *args, **kwargs):
+        return self.sync.find_one(*args, **kwargs)
+
+    async def estimated_document_count(self) -> int:
+        return self.sync.estimated_document_count()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2026
+# @Author :  GitOPEN
+# @Email  :  gitopen@gmail.com
+# @Date   :  2026-10-17 18:21:54
+# @Description :  utils.comatrix 保存结果的测试
+
+
+import json
+
+import numpy as np
+from gitopenlib.utils import comatrix
+
+
+def test_repeated_saves_keep_every_backup(tmp_path):
+    data = [["a", "b"], ["a", "c"], ["b", "c", "a"]]
+    result = comatrix.generate_CoMatrix(str(tmp_path), data, dense=True)
+    # 同一秒内连续保存，之前的每一份结果都应该有备份
+    for i in range(3):
+        kws = [f"{kw}{i}" for kw in result[0]]
+        comatrix.save_CoMatrix(str(tmp_path), (kws, *result[1:]))
+
+    backups = sorted(tmp_path.glob("tags.*.json"))
+    assert len(backups) == 2
+    saved = [json.loads(path.read_text(encoding="utf-8"))[0] for path in backups]
+    assert sorted(saved) == ["a0", "a1"]
+    assert len(list(tmp_path.glob("frequency_matrix*.npy"))) == 3
+
+    loaded = comatrix.load_CoMatrix(str(tmp_path))
+    assert loaded[0][0] == "a2"
+    assert np.array_equal(loaded[1], np.asarray(result[1]))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2026
+# @Author :  GitOPEN
+# @Email  :  gitopen@gmail.com
+# @Date   :  2026-10-17 17:12:05
+# @Description :  indicators.entropy_weight_method 的测试
+
+
+import numpy as np
+import pandas as pd
+import pytest
+from gitopenlib.indicators.entropy_weight_method import EntropyValueMethod, cal_weight
+
+
+def test_constant_column():
+    # 取值都相同的指标权重为0，其他指标的权重不变
+    df = pd.DataFrame({"a": [1, 2, 3, 4], "b": [5] * 4, "c": [3, 1, 2, 9]})
+    weights = cal_weight(df)
+    expected = cal_weight(df[["a", "c"]])
+    assert weights["b"] == 0
+    assert weights["a"] == pytest.approx(expected["a"])
+    assert weights["c"] == pytest.approx(expected["c"])
+    assert sum(weights.values()) == pytest.approx(1)
+
+
+def test_nan_cells_and_chunks():
+    data = np.array([[1, 5, 3], [2, np.nan, 1], [3, 5, 2], [4, 6, 9.0]])
+    weights = cal_weight(data)
+    assert np.isfinite(list(weights.values())).all()
+    assert sum(weights.values()) == pytest.approx(1)
+    chunked = cal_weight(data, chunksize=3)
+    assert list(chunked.values()) == pytest.approx(list(weights.values()))
+
+
+def test_entropy_value_method_zero_column():
+    data = np.array([[1, 0, 3], [2, 0, 1], [3, 0, 2.0]])
+    evm = EntropyValueMethod(data)
+    weights = evm.calculate_weights()
+    assert evm.e_j[1] == 1
+    assert weights == pytest.approx([0.5, 0, 0.5])
+
+    evm = EntropyValueMethod()
+    evm.partial_fit(data[:2]).partial_fit(data[2:])
+    assert evm.finalize() == pytest.approx(weights)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2026
+# @Author :  GitOPEN
+# @Email  :  gitopen@gmail.com
+# @Date   :  2026-10-17 17:40:26
+# @Description :  helpers.mongo 分页读取的测试，使用进程内的 Collection 替身
+
+
+import threading
+import time
+
+import pytest
+from bson.objectid import ObjectId
+from fake_mongo import FakeCollection
+from gitopenlib.helpers import mongo as gm
+
+
+def _docs(n: int) -> list:
+    return [{"_id": ObjectId(), "v": i} for i in range(n)]
+
+
+class LowCountCollection(FakeCollection):
+    """`estimated_document_count`偏小，模拟估计值不准或扫描期间数据增长。"""
+
+    def estimated_document_count(self) -> int:
+        return len(self.docs) // 3
+
+
+def test_round_trip_pages_until_empty():
+    coll = LowCountCollection(_docs(250))
+    pages = list(gm._iter_by_round_trip(coll, ObjectId("0" * 24), None, None, None, 40))
+    assert [len(page) for page in pages] == [40] * 6 + [10]
+    assert [doc["v"] for page in pages for doc in page] == list(range(250))
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_find_by_page_ignores_estimated_count(streaming):
+    coll = LowCountCollection(_docs(250))
+    got = list()
+    gm.find_by_page(coll, 40, lambda data: got.extend(data), streaming=streaming)
+    assert [doc["v"] for doc in got] == list(range(250))
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_aggregate_by_page_ignores_estimated_count(streaming):
+    coll = LowCountCollection(_docs(250))
+    got = list()
+    gm.aggregate_by_page(
+        coll,
+        pipeline=[{"$addFields": {"tag": 1}}],
+        page_size=40,
+        parse_func=lambda data: got.extend(doc["v"] for doc in data),
+        streaming=streaming,
+    )
+    assert got == list(range(250))
+
+
+def _pages(n: int, size: int = 3, fetched: list = None, closed: list = None):
+    """生成 n 页数据，记录已拉取的页数，以及生成器是否被关闭。"""
+    try:
+        for i in range(n):
+            if fetched is not None:
+                fetched.append(i)
+            yield [{"_id": i * size + j, "page": i} for j in range(size)]
+    finally:
+        if closed is not None:
+            closed.append(True)
+
+
+def _page_number(data: list) -> int:
+    # 页号越小处理越慢，使完成的先后与页的顺序不同
+    time.sleep(0.002 * (5 - data[0]["page"] % 5))
+    return data[0]["page"]
+
+
+def test_map_pages_ordered():
+    results = list(gm.map_pages(_pages(40), _page_number, worker_num=4, prefetch=3))
+    assert results == list(range(40))
+
+
+def test_map_pages_unordered():
+    results = list(
+        gm.map_pages(_pages(40), _page_number, worker_num=4, prefetch=3, ordered=False)
+    )
+    assert sorted(results) == list(range(40))
+
+
+def test_map_pages_with_cursor():
+    coll = FakeCollection(_docs(250), latency=0.001)
+    pages = gm.iter_by_page(coll, page_size=40, batch_size=40)
+    results = list(gm.map_pages(pages, lambda data: [doc["v"] for doc in data]))
+    assert [len(page) for page in results] == [40] * 6 + [10]
+    assert sum(results, []) == list(range(250))
+
+
+def test_map_pages_backpressure():
+    fetched = list()
+    results = gm.map_pages(
+        _pages(100, fetched=fetched), _page_number, worker_num=2, prefetch=3
+    )
+    assert next(results) == 0
+    # 消费者停止取结果后，拉取线程最多再拉取 worker_num + 2 * prefetch 页左右
+    time.sleep(0.2)
+    assert len(fetched) <= 2 + 2 * 3 + 2
+    results.close()
+
+
+def _run_with_timeout(func, timeout: float = 10):
+    """在线程中执行 func，超时说明发生了死锁。"""
+    outcome = dict()
+
+    def target():
+        try:
+            outcome["result"] = func()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "deadlock"
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def test_map_pages_parse_error():
+    def parse(data):
+        if data[0]["page"] == 5:
+            raise ValueError("bad page")
+        return _page_number(data)
+
+    closed = list()
+    before = set(threading.enumerate())
+    with pytest.raises(ValueError, match="bad page"):
+        _run_with_timeout(
+            lambda: list(
+                gm.map_pages(
+                    _pages(1000, closed=closed), parse, worker_num=3, prefetch=2
+                )
+            )
+        )
+    assert closed == [True]
+    assert set(threading.enumerate()) <= before
+
+
+def test_map_pages_fetch_error():
+    def pages():
+        yield [{"_id": 0, "page": 0}]
+        raise RuntimeError("cursor lost")
+
+    with pytest.raises(RuntimeError, match="cursor lost"):
+        _run_with_timeout(lambda: list(gm.map_pages(pages(), _page_number)))
+
+
+def test_map_pages_early_exit():
+    closed = list()
+    before = set(threading.enumerate())
+    results = gm.map_pages(
+        _pages(1000, closed=closed), _page_number, worker_num=4, prefetch=4
+    )
+    for _, page in zip(range(3), results):
+        pass
+    _run_with_timeout(results.close)
+    assert closed == [True]
+    assert set(threading.enumerate()) <= before
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2026
+# @Author :  GitOPEN
+# @Email  :  gitopen@gmail.com
+# @Date   :  2026-10-17 16:05:17
+# @Description :  helpers.mongo_async 的测试，使用进程内的 Collection 替身
+
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from bson.objectid import ObjectId
+from fake_mongo import AsyncFakeCollection, FakeCollection, FakeManageDB
+from gitopenlib.helpers import mongo as gm
+from gitopenlib.helpers import mongo_async as gma
+
+
+def _docs(n: int, object_id: bool = True) -> list:
+    return [{"_id": ObjectId() if object_id else i, "v": i} for i in range(n)]
+
+
+async def _collect(aiter) -> list:
+    return [page async for page in aiter]
+
+
+def test_iter_by_page():
+    coll = AsyncFakeCollection(_docs(250))
+    pages = asyncio.run(_collect(gma.iter_by_page(coll, page_size=100)))
+    assert [len(page) for page in pages] == [100, 100, 50]
+    assert [doc["v"] for page in pages for doc in page] == list(range(250))
+
+    start_id, end_id = coll.docs[9]["_id"], coll.docs[29]["_id"]
+    pages = asyncio.run(
+        _collect(gma.iter_by_page(coll, start_id, page_size=8, end_id=end_id))
+    )
+    assert [doc["v"] for page in pages for doc in page] == list(range(10, 30))
+
+
+def test_iter_by_page_without_lower_bound():
+    coll = AsyncFakeCollection(_docs(30, object_id=False))
+    pages = asyncio.run(_collect(gma.iter_by_page(coll, None, page_size=7)))
+    assert sum(len(page) for page in pages) == 30
+
+
+def test_iter_by_page_pipeline():
+    coll = AsyncFakeCollection(_docs(50))
+    pipeline = [{"$addFields": {"tag": 1}}]
+    pages = asyncio.run(
+        _collect(gma.iter_by_page(coll, pipeline=pipeline, page_size=20))
+    )
+    assert [len(page) for page in pages] == [20, 20, 10]
+    assert all(doc["tag"] == 1 for page in pages for doc in page)
+
+
+def test_find_by_page():
+    coll = AsyncFakeCollection(_docs(120))
+    got = list()
+
+    async def parse(data):
+        got.extend(doc["v"] for doc in data)
+
+    asyncio.run(gma.find_by_page(coll, 50, parse))
+    assert got == list(range(120))
+
+    # 普通函数在线程池中执行
+    got.clear()
+    threads = set()
+
+    def parse_sync(data):
+        threads.add(threading.get_ident())
+        got.extend(doc["v"] for doc in data)
+
+    asyncio.run(gma.find_by_page(coll, 50, parse_sync))
+    assert got == list(range(120))
+    assert threading.get_ident() not in threads
+
+
+def test_aggregate_by_page(tmp_path):
+    coll = AsyncFakeCollection(_docs(95))
+    got = list()
+    log_file = str(tmp_path / "aggregate.log")
+    asyncio.run(
+        gma.aggregate_by_page(
+            coll,
+            pipeline=[{"$project": {"v": 1}}],
+            page_size=30,
+            parse_func=lambda data: got.extend(doc["v"] for doc in data),
+            open_log=True,
+            log_file=log_file,
+        )
+    )
+    assert got == list(range(95))
+    with open(log_file) as f:
+        assert "# current_last_id --> {}".format(coll.docs[-1]["_id"]) in f.read()
+
+
+@pytest.mark.parametrize("object_id", [True, False])
+def test_scan_by_partition(object_id):
+    coll = AsyncFakeCollection(_docs(1000, object_id))
+    got = list()
+
+    async def parse(data):
+        got.extend(doc["v"] for doc in data)
+
+    size = asyncio.run(gma.scan_by_partition(coll, parse, 4, page_size=30))
+    assert size == 1000
+    assert sorted(got) == list(range(1000))
+
+
+def test_scan_by_partition_timestamp():
+    coll = AsyncFakeCollection(_docs(500))
+    got = list()
+    size = asyncio.run(
+        gma.scan_by_partition(
+            coll, got.extend, 4, page_size=30, split_method="timestamp"
+        )
+    )
+    assert size == 500
+    assert sorted(doc["v"] for doc in got) == list(range(500))
+
+
+def test_scan_by_partition_resume(tmp_path):
+    coll = AsyncFakeCollection(_docs(1000))
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    got = list()
+    crash = {"on": True}
+
+    async def parse(data):
+        if crash["on"] and data[0]["v"] >= 600:
+            raise RuntimeError("boom")
+        await asyncio.sleep(0)
+        got.extend(doc["v"] for doc in data)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            gma.scan_by_partition(
+                coll, parse, 4, page_size=50, checkpoint_dir=checkpoint_dir
+            )
+        )
+    assert len(got) < 1000
+
+    crash["on"] = False
+    asyncio.run(
+        gma.scan_by_partition(
+            coll, parse, 4, page_size=50, checkpoint_dir=checkpoint_dir
+        )
+    )
+    assert sorted(got) == list(range(1000))
+
+
+def test_checkpoint_does_not_block_event_loop(tmp_path, monkeypatch):
+    coll = AsyncFakeCollection(_docs(100))
+    loop_threads = set()
+    save_threads = set()
+    save_checkpoint = gm._save_checkpoint
+
+    def save(path, state):
+        save_threads.add(threading.get_ident())
+        save_checkpoint(path, state)
+
+    async def parse(data):
+        loop_threads.add(threading.get_ident())
+
+    monkeypatch.setattr(gm, "_save_checkpoint", save)
+    asyncio.run(
+        gma.scan_by_partition(
+            coll, parse, 2, page_size=10, checkpoint_dir=str(tmp_path)
+        )
+    )
+    assert save_threads
+    assert not save_threads & loop_threads
+
+
+def _scan_sync(monkeypatch, docs: list, latency: float, partition_num: int) -> int:
+    coll = FakeCollection(docs, latency=latency)
+    monkeypatch.setattr(FakeManageDB, "collection", coll)
+    monkeypatch.setattr(gm, "ManageDB", FakeManageDB)
+    return gm.scan_by_partition(
+        "db", "coll", len, partition_num, page_size=100, batch_size=100
+    )
+
+
+def _scan_async(docs: list, latency: float, partition_num: int) -> int:
+    coll = AsyncFakeCollection(docs, latency=latency)
+    return asyncio.run(gma.scan_by_partition(coll, len, partition_num, page_size=100))
+
+
+def test_sync_and_async_scan_agree(monkeypatch):
+    docs = _docs(1000)
+    assert _scan_sync(monkeypatch, docs, 0.0, 8) == len(docs)
+    assert _scan_async(docs, 0.0, 8) == len(docs)
+
+
+@pytest.mark.skipif(
+    not os.environ.get("GITOPENLIB_BENCHMARK"),
+    reason="benchmark, set GITOPENLIB_BENCHMARK=1 to run",
+)
+def test_throughput_sync_vs_async(monkeypatch):
+    # 每次网络往返等待 latency 秒，比较同步的线程池、异步的协程和单个游标扫描的吞吐量
+    # 运行：GITOPENLIB_BENCHMARK=1 python -m pytest -s tests -k throughput
+    docs = _docs(4000)
+    latency, partition_num = 0.005, 8
+
+    sync_time = time.time()
+    _scan_sync(monkeypatch, docs, latency, partition_num)
+    sync_time = time.time() - sync_time
+
+    async_time = time.time()
+    _scan_async(docs, latency, partition_num)
+    async_time = time.time() - async_time
+
+    coll = AsyncFakeCollection(docs, latency=latency)
+    serial_time = time.time()
+    asyncio.run(_collect(gma.iter_by_page(coll, page_size=100)))
+    serial_time = time.time() - serial_time
+
+    print(
+        "\n# {} docs, sync threads: {:.0f} docs/s, asyncio: {:.0f} docs/s, "
+        "single cursor: {:.0f} docs/s".format(
+            len(docs),
+            len(docs) / sync_time,
+            len(docs) / async_time,
+            len(docs) / serial_time,
+        )
+    )
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2026
+# @Author :  GitOPEN
+# @Email  :  gitopen@gmail.com
+# @Date   :  2026-10-17 15:32:41
+# @Description :  helpers.mongo.BulkWriter 的测试
+
+
+import threading
+import time
+
+import pytest
+from fake_mongo import FakeCollection
+from gitopenlib.helpers.mongo import BulkWriter
+from pymongo import InsertOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+
+def test_batching():
+    coll = FakeCollection()
+    with BulkWriter(coll, batch_size=100) as writer:
+        for i in range(250):
+            writer.insert_one({"_id": i})
+        assert coll.bulk_calls == [100, 100]
+    assert coll.bulk_calls == [100, 100, 50]
+    assert len(coll.docs) == 250
+    report = writer.report()
+    assert report["nInserted"] == 250
+    assert report["ops"] == 250
+    assert report["flushes"] == 3
+
+
+def test_shared_by_threads():
+    coll = FakeCollection()
+
+    def produce(k):
+        for i in range(250):
+            writer.insert_one({"_id": k * 1000 + i})
+
+    with BulkWriter(coll, batch_size=64) as writer:
+        threads = [threading.Thread(target=produce, args=(k,)) for k in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(coll.docs) == 1000
+    assert writer.report()["nInserted"] == 1000
+    assert sum(coll.bulk_calls) == 1000
+
+
+def test_update_and_replace():
+    coll = FakeCollection([{"_id": 1, "v": 0}, {"_id": 2, "v": 0}])
+    with BulkWriter(coll, batch_size=10) as writer:
+        writer.update_one({"_id": 1}, {"$set": {"v": 1}})
+        writer.replace_one({"_id": 2}, {"w": 2})
+        writer.update_one({"_id": 3}, {"$set": {"v": 3}}, upsert=True)
+    assert coll.docs == [{"_id": 1, "v": 1}, {"_id": 2, "w": 2}, {"_id": 3, "v": 3}]
+    report = writer.report()
+    assert report["nModified"] == 2
+    assert report["nUpserted"] == 1
+
+
+def test_flush_interval_without_new_ops():
+    coll = FakeCollection()
+    writer = BulkWriter(coll, batch_size=1000, flush_interval=0.05)
+    writer.insert_one({"_id": 1})
+    deadline = time.time() + 2
+    while not coll.docs and time.time() < deadline:
+        time.sleep(0.01)
+    assert coll.bulk_calls == [1]
+    writer.close()
+    assert coll.bulk_calls == [1]
+
+
+def test_retry_transient_write_errors():
+    coll = FakeCollection(plan=["stepdown"])
+    with BulkWriter(coll, batch_size=10, retry_interval=0.001) as writer:
+        for i in range(10):
+            writer.insert_one({"_id": i})
+    assert coll.bulk_calls == [10, 5]
+    assert len(coll.docs) == 10
+    assert writer.report()["nInserted"] == 10
+    assert writer.write_errors == []
+
+
+def test_retry_connection_failure():
+    coll = FakeCollection(plan=["net"])
+    with BulkWriter(coll, batch_size=10, retry_interval=0.001) as writer:
+        for i in range(10):
+            writer.insert_one({"_id": i})
+    assert coll.bulk_calls == [10, 10]
+    assert writer.report()["nInserted"] == 10
+
+
+def test_resent_inserts_already_applied():
+    # 第一次写入成功但确认丢失，重试时的重复键错误不算失败
+    coll = FakeCollection(plan=["net_after_write"])
+    with BulkWriter(coll, batch_size=10, retry_interval=0.001) as writer:
+        for i in range(10):
+            writer.insert_one({"_id": i})
+    assert coll.bulk_calls == [10, 10]
+    assert len(coll.docs) == 10
+    assert writer.report()["nInserted"] == 10
+    assert writer.write_errors == []
+
+
+def test_give_up_after_max_retries():
+    coll = FakeCollection(plan=["net"] * 5)
+    writer = BulkWriter(coll, batch_size=2, max_retries=2, retry_interval=0.001)
+    writer.insert_one({"_id": 1})
+    with pytest.raises(AutoReconnect):
+        writer.insert_one({"_id": 2})
+    assert coll.bulk_calls == [2, 2, 2]
+
+
+def test_raise_write_errors():
+    coll = FakeCollection([{"_id": 0}])
+    writer = BulkWriter(coll, batch_size=5)
+    with pytest.raises(BulkWriteError) as info:
+        for i in range(5):
+            writer.insert_one({"_id": i})
+    assert info.value.details["nInserted"] == 4
+    assert [error["code"] for error in info.value.details["writeErrors"]] == [11000]
+    assert len(coll.docs) == 5
+
+
+def test_collect_write_errors():
+    coll = FakeCollection([{"_id": 0}, {"_id": 6}])
+    with BulkWriter(coll, batch_size=5, raise_errors=False) as writer:
+        for i in range(8):
+            writer.insert_one({"_id": i})
+    assert len(writer.write_errors) == 2
+    assert writer.report()["errors"] == 2
+    assert writer.report()["nInserted"] == 6
+    assert len(coll.docs) == 8
+
+
+def test_write_concern_errors():
+    coll = FakeCollection(plan=["write_concern"])
+    writer = BulkWriter(coll, batch_size=3)
+    with pytest.raises(BulkWriteError) as info:
+        for i in range(3):
+            writer.insert_one({"_id": i})
+    assert info.value.details["writeConcernErrors"][0]["code"] == 64
+    assert writer.report()["write_concern_errors"] == 1
+
+    coll = FakeCollection(plan=["write_concern"])
+    with BulkWriter(coll, batch_size=3, raise_errors=False) as writer:
+        for i in range(3):
+            writer.insert_one({"_id": i})
+    assert len(writer.write_concern_errors) == 1
+    assert writer.report()["nInserted"] == 3
+
+
+def _wait_background_error(writer: BulkWriter):
+    deadline = time.time() + 2
+    while writer._error is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert writer._error is not None
+
+
+def test_background_flush_error_raised_later():
+    coll = FakeCollection([{"_id": 1}])
+    writer = BulkWriter(coll, batch_size=1000, flush_interval=0.02)
+    writer.insert_one({"_id": 1})
+    _wait_background_error(writer)
+    with pytest.raises(BulkWriteError):
+        writer.close()
+
+
+def test_ops_written_after_background_error():
+    coll = FakeCollection([{"_id": 1}])
+    writer = BulkWriter(coll, batch_size=1000, flush_interval=0.02)
+    writer.insert_one({"_id": 1})
+    _wait_background_error(writer)
+    # add 抛出之前的异常，但新的操作仍然会被写入
+    with pytest.raises(BulkWriteError):
+        writer.insert_one({"_id": 2})
+    writer.close()
+    assert [doc["_id"] for doc in coll.docs] == [1, 2]
+
+    # close 先写入缓存的操作，再抛出后台线程的异常
+    coll = FakeCollection([{"_id": 1}])
+    writer = BulkWriter(coll, batch_size=1000, flush_interval=0.02)
+    writer.insert_one({"_id": 1})
+    _wait_background_error(writer)
+    # 模拟在后台线程出错之前加入缓存的操作
+    with writer._lock:
+        writer._ops.append(InsertOne({"_id": 99}))
+    with pytest.raises(BulkWriteError):
+        writer.close()
+    assert [doc["_id"] for doc in coll.docs] == [1, 99]
+    assert writer._ops == []
+
+
+def test_close_error_does_not_hide_body_error():
+    coll = FakeCollection([{"_id": 1}])
+    with pytest.raises(ValueError):
+        with BulkWriter(coll, batch_size=1000) as writer:
+            writer.insert_one({"_id": 1})
+            writer.insert_one({"_id": 2})
+            raise ValueError("body")
+    assert [doc["_id"] for doc in coll.docs] == [1, 2]
+    assert writer.report()["nInserted"] == 1
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# Copyright (c) 2026
+# @Author :  GitOPEN
+# @Email  :  gitopen@gmail.com
+# @Date   :  2026-10-17 18:40:12
+# @Description :  indicators.statistics 的测试
+
+
+import numpy as np
+import pytest
+from gitopenlib.indicators import statistics as st
+
+
+@pytest.mark.parametrize("func", [st.percentile, st.percentile2])
+def test_percentile_keeps_input(func):
+    scores = [5, 1, 4, 2, 3]
+    array = np.array(scores)
+    assert func(scores, 50) == func(array, 50) == 3
+    assert scores == [5, 1, 4, 2, 3]
+    assert array.tolist() == [5, 1, 4, 2, 3]
+
+
+def test_percentile_rank():
+    scores = [5, 1, 4, 2, 3]
+    assert st.percentile_rank(scores, 3) == 60
+    assert st.RankIndex(scores).percentile(60) == st.percentile(scores, 60)